@@ -0,0 +1,143 @@
+# Benchmark for the BESTSETCOVER solvers in bestcoverset.py
+#
+# Runs every solver over a grid of instances made by randomProblem and a range of budgets,
+# and writes one JSON object per run (one per line) with the wall time, search nodes expanded,
+# neighbors scored, peak memory and cost of the solution found.
+#
+#   python bench_bestcoverset.py [--output results.jsonl] [--label NAME] [--compare old.jsonl]
+#
+# Keep the output of a version and pass it to --compare when benchmarking the next one to
+# print how the time of every run has changed.
+import sys
+import io
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import contextlib
+import numpy as np
+import bestcoverset as bsc
+
+# instances: (elements, sets, density, seed)
+INSTANCES = [
+    (20, 8, 0.3, 1),
+    (40, 14, 0.2, 2),
+    (60, 20, 0.15, 3),
+    (200, 40, 0.1, 4),
+    (1000, 100, 0.05, 5),
+    (5000, 300, 0.02, 6),
+]
+
+# budgets, as multiples of the total cost of the elements (no cover costs less than that)
+BUDGETS = [1.2, 1.5, 2.0, 3.0, 5.0]
+
+NTRIES = 50
+SEED = 1
+
+# solvers: name, largest number of sets to run it on, function(problem, budget) -> (solution, found)
+# the exhaustive solvers are only run on small instances
+SOLVERS = [
+    ('IDS', 14, lambda p, b: bsc.BestSetCoverIDS(p, b, False)),
+    ('IDSLazy', 20, lambda p, b: bsc.BestSetCoverIDSLazy(p, b, False)),
+    ('BnB', 100, lambda p, b: bsc.BestSetCoverBnB(p, b, False)),
+    ('HillClimb', 300, lambda p, b: bsc.testHC(p, b, NTRIES, False, SEED)),
+    ('HillClimbVectorized', 300, lambda p, b: seeded(bsc.BestSetCoverHillClimbVectorized, p, b)),
+    ('HillClimbParallel', 300, lambda p, b: bsc.BestSetCoverHillClimbParallel(p, b, NTRIES, False, SEED)),
+]
+
+def seeded(solver,problem,budget):
+    np.random.seed(SEED)
+    return solver(problem, budget, NTRIES, False)
+
+# runs solver once, with its printed output discarded, and returns
+# (seconds, stats, solution, found), or the peak memory in bytes if memory is true
+def runOnce(solver,problem,budget,memory):
+    bsc.resetStats()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if memory:
+            tracemalloc.start()
+            solver(problem, budget)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+        start = time.perf_counter()
+        solution, found = solver(problem, budget)
+        seconds = time.perf_counter() - start
+    return seconds, dict(bsc.stats), solution, found
+
+# the grid of runs, as a list of result dicts. Time and counters come from one run and the
+# peak memory from a second one, since tracing allocations slows the solvers down.
+# The memory of the parallel solver's worker processes is not included.
+def benchmark(label,memory=True,solvers=None):
+    results = []
+    for num_elements, num_sets, density, seed in INSTANCES:
+        cp = bsc.randomProblem(num_elements, num_sets, density, seed)
+        total = sum(e.cost for e in cp.omega)
+        for factor in BUDGETS:
+            budget = int(total * factor)
+            for name, max_sets, solver in SOLVERS:
+                if num_sets > max_sets or (solvers and name not in solvers):
+                    continue
+                seconds, counts, solution, found = runOnce(solver, cp, budget, False)
+                results.append({
+                    'label': label,
+                    'solver': name,
+                    'elements': num_elements,
+                    'sets': num_sets,
+                    'density': density,
+                    'seed': seed,
+                    'budget': budget,
+                    'seconds': seconds,
+                    'nodes': counts['nodes'],
+                    'neighbors': counts['neighbors'],
+                    'peak_bytes': runOnce(solver, cp, budget, True) if memory else None,
+                    'found': found,
+                    'cost': sum(c.cost for c in solution) if found else None,
+                })
+                print(f"{name:20} {num_elements:6} x {num_sets:4} budget {budget:7}: "
+                      f"{seconds:9.4f}s found={found}", file=sys.stderr)
+    return results
+
+def runKey(result):
+    return (result['solver'], result['elements'], result['sets'], result['density'],
+            result['seed'], result['budget'])
+
+# prints the time of every run in results relative to the same run in baseline
+def compare(results,baseline,file=sys.stdout):
+    old = {runKey(r): r for r in baseline}
+    for r in results:
+        before = old.get(runKey(r))
+        if before is None or before['seconds'] == 0:
+            continue
+        ratio = r['seconds'] / before['seconds']
+        note = '' if r['cost'] == before['cost'] else f" cost {before['cost']} -> {r['cost']}"
+        print(f"{r['solver']:20} {r['elements']:6} x {r['sets']:4} budget {r['budget']:7}: "
+              f"{before['seconds']:9.4f}s -> {r['seconds']:9.4f}s ({ratio:.2f}x){note}", file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the BESTSETCOVER solvers.')
+    parser.add_argument('--output', help='file to write the results to, one JSON object per line (default: stdout)')
+    parser.add_argument('--label', default='', help='name of this version, stored with every result')
+    parser.add_argument('--compare', help='results of an earlier run to compare the times against')
+    parser.add_argument('--solver', action='append', help='only run this solver (may be repeated)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory runs')
+    args = parser.parse_args()
+
+    label = args.label or f"python {platform.python_version()} numpy {np.__version__}"
+    results = benchmark(label, not args.no_memory, args.solver)
+
+    lines = ''.join(json.dumps(r) + '\n' for r in results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(lines)
+    else:
+        sys.stdout.write(lines)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = [json.loads(line) for line in file if line.strip()]
+        compare(results, baseline, sys.stdout if args.output else sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+# Benchmark for DocumentClassifier in classifier.py
+#
+# Generates seeded synthetic corpora in the corpus file format (name line, label line,
+# body lines, blank line) over a grid of document counts, vocabulary sizes and label
+# counts, and times each stage of a train/test run separately: load_corpus, _clean_text,
+# compute_counts, calculate_probabilities (calculate_probability_arrays when vectorized)
+# and classify_documents. Writes one JSON object per corpus and mode (one per line) with
+# the seconds and peak memory of every stage.
+#
+#   python bench_classifier.py [--output results.jsonl] [--label NAME] [--compare old.jsonl]
+#                              [--profile DIR]
+#
+# Keep the output of a version and pass it to --compare when benchmarking the next one to
+# print how the time of every stage has changed. --profile DIR also writes a cProfile
+# file for every stage, DIR/<documents>-<vocabulary>-<labels>-<mode>-<stage>.prof.
+import os
+import sys
+import json
+import time
+import cProfile
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+from typing import List, Dict, Tuple, Optional, Callable, ContextManager
+
+import numpy as np
+
+from classifier import DocumentClassifier
+
+# corpora: (documents, vocabulary size, labels, seed)
+CORPORA = [
+    (1000, 2000, 5, 1),
+    (5000, 10000, 10, 2),
+    (20000, 30000, 20, 3),
+]
+
+# the first TRAIN_FRACTION of every corpus is trained on and the rest classified
+TRAIN_FRACTION = 0.8
+
+WORDS_PER_DOCUMENT = 80
+WORDS_PER_LINE = 12
+
+# modes: name, DocumentClassifier(vectorized=...)
+MODES = [
+    ('dict', False),
+    ('vectorized', True),
+]
+
+STAGES = ['load_corpus', 'clean_text', 'compute_counts', 'calculate_probabilities', 'classify_documents']
+
+def make_vocabulary(rng: np.random.Generator, size: int) -> List[str]:
+    # distinct lowercase words of 4 to 9 letters that are not stop words
+    stop_words = DocumentClassifier().stop_words
+    words = {}
+    while len(words) < size:
+        letters = rng.integers(97, 123, size=(size, 9))
+        lengths = rng.integers(4, 10, size=size)
+        for row, length in zip(letters, lengths):
+            word = bytes(row[:length].tolist()).decode('ascii')
+            if word not in stop_words:
+                words[word] = None
+    return list(words)[:size]
+
+def write_corpus(filename: str, num_documents: int, vocabulary_size: int, num_labels: int, seed: int):
+    # term frequencies are Zipf-like, and each label favours its own tenth of the
+    # vocabulary so that there is something to learn. Bodies include punctuation,
+    # numbers and stop words for _clean_text to remove.
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(make_vocabulary(rng, vocabulary_size) + ['the', 'and', 'of', '1999'])
+    ranks = np.arange(1, vocabulary_size + 1)
+    cumulative = []
+    for _ in range(num_labels):
+        weights = 1 / ranks ** 1.1 * np.where(rng.random(vocabulary_size) < 0.1, 5, 1)
+        weights = np.concatenate([weights, np.full(4, weights.sum() / 20)])
+        cumulative.append(np.cumsum(weights) / weights.sum())
+
+    with open(filename, 'w') as file:
+        for doc in range(num_documents):
+            label = int(rng.integers(num_labels))
+            count = max(1, int(rng.poisson(WORDS_PER_DOCUMENT)))
+            words = vocabulary[np.searchsorted(cumulative[label], rng.random(count))].tolist()
+            for i in np.flatnonzero(rng.random(count) < 0.05).tolist():
+                words[i] = words[i].capitalize() + ','
+            lines = [' '.join(words[start:start + WORDS_PER_LINE]) + '.'
+                     for start in range(0, count, WORDS_PER_LINE)]
+            file.write(f"Doc {doc}\nLabel{label}\n" + '\n'.join(lines) + '\n\n')
+
+def read_bodies(filename: str) -> List[str]:
+    # the raw body text of every document of a corpus file, for timing _clean_text alone
+    with open(filename) as file:
+        return [' '.join(doc.strip().split('\n')[2:]) for doc in file.read().split('\n\n') if doc.strip()]
+
+def no_hook(stage: str) -> ContextManager:
+    return contextlib.nullcontext()
+
+def profile_hook(directory: str, prefix: str) -> Callable[[str], ContextManager]:
+    # a hook that profiles each stage into directory/prefix-stage.prof
+    @contextlib.contextmanager
+    def hook(stage):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(directory, f"{prefix}-{stage}.prof"))
+    return hook
+
+# runs every stage once and returns ({stage: seconds}, {stage: peak bytes}, accuracy).
+# With memory, each stage's peak is the most memory allocated during it beyond what was
+# allocated when it started; tracing slows the stages down, so their times are then not
+# representative. hook(stage) is a context manager entered around each stage.
+def run_stages(filename: str, train_size: int, vectorized: bool, memory: bool,
+               hook: Callable[[str], ContextManager] = no_hook) -> Tuple[Dict[str, float], Dict[str, int], float]:
+    bodies = read_bodies(filename)
+    classifier = DocumentClassifier(vectorized=vectorized)
+    calculate = classifier.calculate_probability_arrays if vectorized else classifier.calculate_probabilities
+    seconds = {}
+    peaks = {}
+
+    def stage(name, function, *args):
+        if memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        with hook(name):
+            start = time.perf_counter()
+            result = function(*args)
+            seconds[name] = time.perf_counter() - start
+        if memory:
+            peaks[name] = tracemalloc.get_traced_memory()[1] - before
+        return result
+
+    if memory:
+        tracemalloc.start()
+    try:
+        training_set, test_set = stage('load_corpus', classifier.load_corpus, filename, train_size)
+        stage('clean_text', lambda: [classifier._clean_text(body) for body in bodies])
+        stage('compute_counts', classifier.compute_counts, training_set)
+        stage('calculate_probabilities', calculate, training_set)
+        predictions = stage('classify_documents', classifier.classify_documents, test_set)
+    finally:
+        if memory:
+            tracemalloc.stop()
+
+    correct = sum(actual == predicted for _, actual, predicted, _ in predictions)
+    return seconds, peaks, correct / len(predictions)
+
+# the grid of runs, as a list of result dicts. Times come from one run and the peak memory
+# from a second one; with profile_directory, a third run writes the profiles.
+def benchmark(label: str, memory: bool = True, modes: Optional[List[str]] = None,
+              profile_directory: Optional[str] = None) -> List[Dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for num_documents, vocabulary_size, num_labels, seed in CORPORA:
+            filename = os.path.join(directory, 'corpus.txt')
+            write_corpus(filename, num_documents, vocabulary_size, num_labels, seed)
+            train_size = int(num_documents * TRAIN_FRACTION)
+            for mode, vectorized in MODES:
+                if modes and mode not in modes:
+                    continue
+                seconds, _, accuracy = run_stages(filename, train_size, vectorized, False)
+                peaks = run_stages(filename, train_size, vectorized, True)[1] if memory else {}
+                if profile_directory:
+                    prefix = f"{num_documents}-{vocabulary_size}-{num_labels}-{mode}"
+                    run_stages(filename, train_size, vectorized, False, profile_hook(profile_directory, prefix))
+                result = {
+                    'label': label,
+                    'mode': mode,
+                    'documents': num_documents,
+                    'vocabulary': vocabulary_size,
+                    'labels': num_labels,
+                    'seed': seed,
+                    'train_size': train_size,
+                    'accuracy': accuracy,
+                    'total_seconds': sum(seconds.values()),
+                }
+                for name in STAGES:
+                    result[f"{name}_seconds"] = seconds[name]
+                    result[f"{name}_peak_bytes"] = peaks.get(name)
+                results.append(result)
+                print(f"{mode:10} {num_documents:6} docs {vocabulary_size:6} terms {num_labels:3} labels: "
+                      + ' '.join(f"{name} {seconds[name]:.3f}s" for name in STAGES), file=sys.stderr)
+    return results
+
+def run_key(result: Dict) -> Tuple:
+    return (result['mode'], result['documents'], result['vocabulary'], result['labels'], result['seed'])
+
+# prints the time of every stage in results relative to the same stage in baseline
+def compare(results: List[Dict], baseline: List[Dict], file=sys.stdout):
+    old = {run_key(r): r for r in baseline}
+    for r in results:
+        before = old.get(run_key(r))
+        if before is None:
+            continue
+        for name in STAGES + ['total']:
+            key = f"{name}_seconds"
+            if not before.get(key):
+                continue
+            print(f"{r['mode']:10} {r['documents']:6} docs {name:24}: {before[key]:9.4f}s -> "
+                  f"{r[key]:9.4f}s ({r[key] / before[key]:.2f}x)", file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the stages of DocumentClassifier.')
+    parser.add_argument('--output', help='file to write the results to, one JSON object per line (default: stdout)')
+    parser.add_argument('--label', default='', help='name of this version, stored with every result')
+    parser.add_argument('--compare', help='results of an earlier run to compare the times against')
+    parser.add_argument('--mode', action='append', choices=[name for name, _ in MODES],
+                        help='only run this mode (may be repeated)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory runs')
+    parser.add_argument('--profile', metavar='DIR', help='write a cProfile file per stage to DIR')
+    args = parser.parse_args()
+
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+    label = args.label or f"python {platform.python_version()} numpy {np.__version__}"
+    results = benchmark(label, not args.no_memory, args.mode, args.profile)
+
+    lines = ''.join(json.dumps(r) + '\n' for r in results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(lines)
+    else:
+        sys.stdout.write(lines)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = [json.loads(line) for line in file if line.strip()]
+        compare(results, baseline, sys.stdout if args.output else sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,25 @@
 # Code for Programming Assignment 1, CSCI-UA.0472
 #Yaoge Hu
+import os
+import math
+import time
+import heapq
+import gzip
+from fractions import Fraction
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
+# stats counts the work done by the solvers: search nodes expanded by the exact
+# solvers and neighbors scored by the local searches. It is never reset by the
+# solvers themselves; call resetStats() before the run to be measured.
+
+stats = {'nodes': 0, 'neighbors': 0}
+
+def resetStats():
+    for key in stats:
+        stats[key] = 0
+
 # An Element consists of a name (a string) and a cost (a number)
 
 class Element:
@@ -38,6 +56,377 @@ def problem1():
     return {ea,eb,ec,ed,ee,ef,eg,eh}, [s1,s2,s3,s4,s5,s6]
 
 
+# A CompiledProblem is the bitset form of an instance (omega,collection).
+# Every Element gets an index, every CSet becomes an integer bitmask over those
+# indices with its cost precomputed, so the solvers can take unions and
+# differences with | and & ~ instead of allocating new Python sets.
+# The Elements of omega take the low bits; Elements that appear in some CSet
+# but not in omega get the bits above them, so omega_mask is exactly omega.
+
+class CompiledProblem:
+    def __init__(self,omega,collection):
+        self.omega = omega
+        self.collection = collection
+        self.elements = list(omega)
+        self.index = {e: i for i, e in enumerate(self.elements)}
+        for cset in collection:
+            for e in cset.elements:
+                if e not in self.index:
+                    self.index[e] = len(self.elements)
+                    self.elements.append(e)
+        self.omega_mask = (1 << len(omega)) - 1
+        self.masks = []
+        for cset in collection:
+            mask = 0
+            for e in cset.elements:
+                mask |= 1 << self.index[e]
+            self.masks.append(mask)
+        self.costs = [cset.cost for cset in collection]
+        self.position = {cset: i for i, cset in enumerate(collection)}
+        # sets by name, for CSets of another build of the same instance; None marks a
+        # name shared by several sets
+        self.named = {}
+        for i, cset in enumerate(collection):
+            self.named[cset.name] = None if cset.name in self.named else i
+        # the same sets as lists of the indices of their elements in omega, with element costs,
+        # for the solvers that keep per-element cover counts
+        self.members = [[self.index[e] for e in cset.elements if e in omega] for cset in collection]
+        self.element_costs = [e.cost for e in self.elements]
+        # True if every cost is an integer, so sums of costs are exact
+        self.integral = all(isinstance(c, (int, np.integer)) for c in self.element_costs + self.costs)
+        # elements of omega grouped by cost, so the cost of a set of elements
+        # is a weighted popcount: sum of cost * (mask & cost_mask).bit_count()
+        by_cost = {}
+        for e in omega:
+            by_cost[e.cost] = by_cost.get(e.cost, 0) | (1 << self.index[e])
+        self.cost_masks = list(by_cost.items())
+
+    # total cost of the elements in the bitmask remain (only omega bits count)
+    def uncovered_cost(self,remain):
+        return sum(cost * (remain & mask).bit_count() for cost, mask in self.cost_masks)
+
+    # union of the CSets with the given indices, as a bitmask
+    def union(self,indices):
+        covered = 0
+        for i in indices:
+            covered |= self.masks[i]
+        return covered
+
+    # True if the CSets with the given indices cover exactly omega
+    def covers(self,indices):
+        return self.union(indices) == self.omega_mask
+
+    # indices in collection of the given CSets. Each call of a problem function builds new
+    # CSets, so a CSet that is not in collection is looked up by its name; an int is taken
+    # as an index already
+    def indices(self,csets):
+        result = []
+        for c in csets:
+            if isinstance(c, (int, np.integer)):
+                result.append(int(c))
+            elif c in self.position:
+                result.append(self.position[c])
+            elif self.named.get(c.name) is not None:
+                result.append(self.named[c.name])
+            elif c.name in self.named:
+                raise ValueError(f"several sets are named {c.name}, pass the compiled problem's CSets")
+            else:
+                raise ValueError(f"no set named {c.name}")
+        return result
+
+    # a CompiledProblem can be passed wherever a problem function is expected
+    def __call__(self):
+        return self.omega, self.collection
+
+# compile_problem returns the CompiledProblem of problem, which is either a problem
+# function or a CompiledProblem already (as returned by loadProblem and randomProblem),
+# which is used as it is so the instance is only compiled once
+
+def compile_problem(problem):
+    if isinstance(problem, CompiledProblem):
+        return problem
+    omega, collection = problem()
+    return CompiledProblem(omega, collection)
+
+
+# Large instances are stored in a text file, gzipped if its name ends in .gz:
+#   bestsetcover <number of elements> <number of sets> <number of elements in omega>
+#   one line per element:  <name> <cost>, the elements of omega first
+#   one line per set:      <name> <index of each of its elements, counting from 0>
+# A header without the last number has every element in omega.
+# loadProblem reads such a file a line at a time and returns its CompiledProblem.
+# It is cached, keyed by the file's path, size and modification time, so loading the
+# same file again costs nothing.
+
+_loaded = {}
+
+def loadProblem(filename):
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_size, stat.st_mtime)
+    if key not in _loaded:
+        with _openProblemFile(filename, 'rt') as file:
+            header = file.readline().split()
+            if len(header) not in (3, 4) or header[0] != 'bestsetcover':
+                raise ValueError(f"{filename} is not a bestsetcover instance")
+            num_elements, num_sets = int(header[1]), int(header[2])
+            num_omega = int(header[3]) if len(header) == 4 else num_elements
+            elements = []
+            for _ in range(num_elements):
+                name, cost = file.readline().split()
+                elements.append(Element(name, _parseCost(cost)))
+            collection = []
+            for _ in range(num_sets):
+                fields = file.readline().split()
+                collection.append(CSet(fields[0], {elements[int(i)] for i in fields[1:]}))
+        _loaded[key] = CompiledProblem(set(elements[:num_omega]), collection)
+    return _loaded[key]
+
+# saveProblem writes problem (a problem function or a CompiledProblem) in the format above.
+# Elements that are in some set but not in omega are written after those of omega, so
+# loading the file back gives the same omega. Fields are separated by whitespace, so a
+# ValueError is raised, before anything is written, for a name that is empty or has any.
+
+def saveProblem(problem,filename):
+    cp = compile_problem(problem)
+    for item in cp.elements + cp.collection:
+        if str(item.name).split() != [str(item.name)]:
+            raise ValueError(f"cannot save {item.name!r}: names must be non-empty and have no whitespace")
+    with _openProblemFile(filename, 'wt') as file:
+        file.write(f"bestsetcover {len(cp.elements)} {len(cp.collection)} {len(cp.omega)}\n")
+        for e in cp.elements:
+            file.write(f"{e.name} {e.cost}\n")
+        for cset in cp.collection:
+            indices = sorted(cp.index[e] for e in cset.elements)
+            file.write(cset.name + ''.join(f" {i}" for i in indices) + "\n")
+
+def _openProblemFile(filename,mode):
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode)
+    return open(filename, mode)
+
+def _parseCost(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+# randomProblem generates a CompiledProblem with num_elements elements 'e0', 'e1', ...
+# and num_sets sets 'S1', 'S2', ..., from the random seed seed.
+# Each set gets each element with probability density (and at least one element), and any
+# element left in no set is then added to a random set, so every element can be covered.
+# Element costs are integers from low to high: uniformly distributed if distribution is
+# 'uniform', and if it is 'exponential', low plus an exponentially distributed amount with
+# mean (high-low)/4, cut off at high.
+
+def randomProblem(num_elements,num_sets,density,seed,low=1,high=10,distribution='uniform'):
+    rng = np.random.default_rng(seed)
+    if distribution == 'uniform':
+        costs = rng.integers(low, high + 1, num_elements)
+    elif distribution == 'exponential':
+        costs = np.minimum(low + np.floor(rng.exponential((high - low) / 4, num_elements)), high)
+    else:
+        raise ValueError(f"Unknown cost distribution {distribution!r}")
+    elements = [Element(f'e{i}', int(cost)) for i, cost in enumerate(costs)]
+
+    members = []
+    covered = np.zeros(num_elements, dtype=bool)
+    for _ in range(num_sets):
+        size = max(1, rng.binomial(num_elements, density))
+        chosen = rng.choice(num_elements, size, replace=False)
+        covered[chosen] = True
+        members.append(list(chosen))
+    for i in np.flatnonzero(~covered):
+        members[rng.integers(num_sets)].append(i)
+
+    collection = [CSet(f'S{j + 1}', {elements[i] for i in chosen}) for j, chosen in enumerate(members)]
+    return CompiledProblem(set(elements), collection)
+
+
+# An ArrayProblem is the NumPy form of a CompiledProblem: incidence[e, j] is 1 if set j
+# covers element e of omega, with the element costs and set costs as vectors.
+# A state is a boolean vector over the sets, and a batch of states a 2D array with one
+# state per row; errors() and neighbor_errors() score a whole batch with a few matrix
+# products and give the same values as the error used by BestSetCoverHillClimb
+# (budget overrun + cost of the uncovered elements).
+# With non-integral costs a state and its neighbors are summed in different orders, so
+# the same state can score 1.0 from one side and 0.9999999999999999 from the other: errors
+# within tolerance(budget) of 0 are returned as 0, and BestSetCoverHillClimbVectorized only
+# moves for an improvement larger than it (it is 0 for integral costs and budget).
+
+class ArrayProblem:
+    def __init__(self,cp):
+        self.cp = cp
+        n = len(cp.omega)
+        self.incidence = np.zeros((n, len(cp.collection)))
+        for j, members in enumerate(cp.members):
+            self.incidence[members, j] = 1
+        self.element_costs = np.array(cp.element_costs[:n], dtype=float)
+        self.costs = np.array(cp.costs, dtype=float)
+        # the arithmetic is done in floats for the matrix products; with integer
+        # costs and budget the errors are exact and are handed back as integers
+        self.integral = all(isinstance(c, (int, np.integer)) for c in cp.element_costs[:n])
+        self.total = self.element_costs.sum() + self.costs.sum()
+
+    def exact(self,budget):
+        return self.integral and isinstance(budget, (int, np.integer))
+
+    def tolerance(self,budget):
+        if self.exact(budget):
+            return 0
+        return 1e-9 * max(self.total, abs(budget), 1)
+
+    def _result(self,err,budget):
+        if self.exact(budget):
+            return np.rint(err).astype(np.int64)
+        return np.where(np.abs(err) <= self.tolerance(budget), 0.0, err)
+
+    # budget overrun of the costs cost; as in CoverState, an overrun of no more than
+    # OVERRUN_TOLERANCE times the budget counts as none when costs are not integral
+    def _overrun(self,cost,budget):
+        over = cost - budget
+        if self.integral:
+            return np.maximum(over, 0)
+        return np.where(over > OVERRUN_TOLERANCE * abs(budget), over, 0)
+
+    # errors of the states in states (one state, or one per row)
+    def errors(self,states,budget):
+        states = np.asarray(states, dtype=float)
+        counts = states @ self.incidence.T
+        uncovered = (counts == 0) @ self.element_costs
+        cost = states @ self.costs
+        return self._result(self._overrun(cost, budget) + uncovered, budget)
+
+    # errors of the neighbors of the states in states: entry [..., j] is the error of
+    # the state with set j toggled
+    def neighbor_errors(self,states,budget):
+        chosen = np.asarray(states, dtype=bool)
+        states = chosen.astype(float)
+        counts = states @ self.incidence.T
+        zero = (counts == 0) * self.element_costs
+        once = (counts == 1) * self.element_costs
+        uncovered = zero.sum(axis=-1)[..., None]
+        cost = (states @ self.costs)[..., None]
+        # adding set j covers its uncovered elements; removing it uncovers
+        # the elements it is the only chosen set to cover
+        added = self._overrun(cost + self.costs, budget) + uncovered - zero @ self.incidence
+        removed = self._overrun(cost - self.costs, budget) + uncovered + once @ self.incidence
+        return self._result(np.where(chosen, removed, added), budget)
+
+
+# Warm starts. greedyCover and relaxedCover build a cover of omega quickly, to be passed to
+# BestSetCoverIDS, BestSetCoverHillClimb and BestSetCoverAnneal as their start argument.
+# A start is resolved by CompiledProblem.indices: CSets of the same problem, from the same
+# CompiledProblem or (when the set names are unique) any call of the problem function, or
+# indices into its collection.
+# Only sets with no elements outside omega are used, since no other set can be in a solution.
+
+# greedyCover returns a cover of omega as a list of CSets, or None if omega cannot be covered.
+# It repeatedly takes the set covering the most uncovered cost per unit of its own cost,
+# keeping the sets in a heap whose scores are only recomputed when a set reaches the top
+# (a set's score can only go down as more is covered), and then drops the sets that the
+# rest of the cover makes redundant, most expensive first.
+
+def greedyCover(problem):
+    cp = compile_problem(problem)
+    chosen = _greedyIndices(cp, [], cp.costs)
+    if chosen is None:
+        return None
+    return [cp.collection[i] for i in chosen]
+
+# relaxedCover returns (cover, lower bound): a cover of omega as a list of CSets, or None if
+# omega cannot be covered, and a lower bound on the cost of every cover.
+# It solves the Lagrangian dual of the linear relaxation (min cost.x with every element
+# covered at least once, 0 <= x <= 1) by subgradient steps with NumPy, which converges to
+# the bound of the fractional relaxation. The sets of negative reduced cost at the best
+# multipliers are rounded up to 1, and the cover is completed greedily on the reduced costs;
+# the cheaper of that and greedyCover's cover is returned.
+
+def relaxedCover(problem,iterations=200):
+    cp = compile_problem(problem)
+    greedy = _greedyIndices(cp, [], cp.costs)
+    if greedy is None:
+        return None, float('inf')
+    usable = [j for j in range(len(cp.collection)) if not cp.masks[j] & ~cp.omega_mask]
+    incidence = ArrayProblem(cp).incidence[:, usable]
+    costs = np.array([cp.costs[j] for j in usable], dtype=float)
+    upper = sum(cp.costs[j] for j in greedy)
+
+    # start every element at the cheapest per-element price of a set containing it
+    sizes = np.maximum(incidence.sum(axis=0), 1)
+    prices = np.where(incidence > 0, (costs / sizes)[None, :], np.inf)
+    u = prices.min(axis=1)
+    best_lower, best_u = 0.0, u
+    step = 2.0
+    stalled = 0
+    for _ in range(iterations):
+        reduced = costs - u @ incidence
+        x = reduced < 0
+        lower = u.sum() + reduced[x].sum()
+        if lower > best_lower:
+            best_lower, best_u = lower, u
+            stalled = 0
+        else:
+            stalled += 1
+            if stalled == 20:
+                step, stalled = step / 2, 0
+        gradient = 1 - incidence @ x
+        norm = (gradient ** 2).sum()
+        if norm == 0 or upper - lower <= 1e-9:
+            break
+        u = np.maximum(0, u + step * (upper - lower) / norm * gradient)
+
+    reduced = costs - best_u @ incidence
+    fixed = [usable[k] for k in np.flatnonzero(reduced < 0)]
+    priced = list(cp.costs)
+    for k, j in enumerate(usable):
+        priced[j] = max(reduced[k], 0)
+    rounded = _greedyIndices(cp, fixed, priced)
+    if sum(cp.costs[j] for j in rounded) < upper:
+        greedy = rounded
+    return [cp.collection[i] for i in greedy], best_lower
+
+# greedy cover on cp starting from the set indices in fixed, scoring sets by uncovered cost
+# per unit of prices[j] (ties going to the set covering more elements), with redundant sets
+# removed at the end; a list of set indices, or None if omega cannot be covered
+def _greedyIndices(cp,fixed,prices):
+    usable = [j for j in range(len(cp.collection)) if not cp.masks[j] & ~cp.omega_mask]
+    chosen = list(dict.fromkeys(fixed))
+    remain = cp.omega_mask & ~cp.union(chosen)
+
+    def score(j):
+        overlap = cp.masks[j] & remain
+        gain = cp.uncovered_cost(overlap)
+        ratio = gain / prices[j] if prices[j] > 0 else float('inf')
+        return (ratio, overlap.bit_count())
+
+    heap = [(tuple(-v for v in score(j)), j) for j in usable if j not in chosen and cp.masks[j] & remain]
+    heapq.heapify(heap)
+    while remain and heap:
+        key, j = heapq.heappop(heap)
+        if not cp.masks[j] & remain:
+            continue
+        current = tuple(-v for v in score(j))
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, j))
+            continue
+        chosen.append(j)
+        remain &= ~cp.masks[j]
+    if remain:
+        return None
+
+    # reverse delete: a set is redundant if every element it covers is covered twice
+    count = [0] * len(cp.elements)
+    for j in chosen:
+        for e in cp.members[j]:
+            count[e] += 1
+    for j in sorted(chosen, key=lambda j: -cp.costs[j]):
+        if all(count[e] > 1 for e in cp.members[j]):
+            chosen.remove(j)
+            for e in cp.members[j]:
+                count[e] -= 1
+    return chosen
+
+
 ## BestSetCoverIDS uses iterative deepening search to solve an instance of BESTSETCOVER
 ## problem is a pair (omega,collection) where omega is a set of Elements and collection is
 ## a list of CSets
@@ -48,20 +437,43 @@ def problem1():
 # 2. A Boolean 
 # It should print out either just the solution, if verbose is false, or a trace of the execution
 # if verbose is true
+## start, if given, is a warm start (a list of CSets, e.g. from greedyCover). If it covers omega
+## within budget it is an upper bound on the depth: only shallower depths are searched, and it
+## is the solution if none of them has one
 
-def BestSetCoverIDS(problem,budget,verbose):
+def BestSetCoverIDS(problem,budget,verbose,start=None):
 ## WRITE THE CODE FOR THIS
-    omega, collection = problem()
+    cp = compile_problem(problem)
+    collection = cp.collection
+    masks = cp.masks
+    costs = cp.costs
     
     # max depth of the state space
     dpth = len(collection)
+
+    incumbent = None
+    if start is not None:
+        chosen = cp.indices(start)
+        if cp.covers(chosen) and sum(costs[i] for i in chosen) <= budget:
+            incumbent = chosen
+            dpth = len(chosen) - 1
+
+    # answer when no depth up to dpth has a solution
+    def no_solution():
+        if incumbent is None:
+            return set(), False
+        if verbose:
+            solution_names = sorted(collection[i].name for i in incumbent)
+            print(f"Solution found at depth {len(incumbent)} (warm start): {{{', '.join(solution_names)}}}")
+        return {collection[i] for i in incumbent}, True
     
-    # dfs function: return all legitimate combinations of sets(subset of collection) at the same depth
+    # dfs function: return all legitimate combinations of sets(indices into collection) at the same depth
     def search(remain_omega, selected_sets, start_idx, cur_depth, max_depth, cur_cost):
+        stats['nodes'] += 1
         
         #base case: reach the depth and return each state's combination of sets at the maxdepth
         if cur_depth == max_depth:
-            return [set(selected_sets)] 
+            return [selected_sets] 
         
         if cur_cost > budget:
             return []
@@ -70,20 +482,19 @@ def BestSetCoverIDS(problem,budget,verbose):
 
         #find the rest of the sets for one state at the same depth
         for i in range(start_idx, len(collection)):
-            cset = collection[i]
 
             
-            new_remain_omega = remain_omega - cset.elements
+            new_remain_omega = remain_omega & ~masks[i]
 
             
-            if cur_cost + cset.cost > budget:
+            if cur_cost + costs[i] > budget:
                 continue
 
             #add the set to the new sets if satisfy added cost < budget
-            new_selected_sets = selected_sets + [cset]
+            new_selected_sets = selected_sets + [i]
 
             #update parameters and recursivly find the combination of sets
-            results = search(new_remain_omega, new_selected_sets, i + 1, cur_depth + 1, max_depth, cur_cost + cset.cost)
+            results = search(new_remain_omega, new_selected_sets, i + 1, cur_depth + 1, max_depth, cur_cost + costs[i])
             
 
             all_results.extend(results)
@@ -98,37 +509,221 @@ def BestSetCoverIDS(problem,budget,verbose):
             print("New States :")
         
         #dfs call
-        all_states = search(omega, [], 0, 0, depth, 0)
+        all_states = search(cp.omega_mask, [], 0, 0, depth, 0)
 
     
         if not all_states:
             if verbose:
                 print(f"Search terminated at depth {depth}")
-            return set(), False
+            return no_solution()
 
         
         #print states at each depth
         for state in all_states:
-            state_trace = '{' + ', '.join(sorted(c.name for c in state)) + '}' 
             if verbose:
+                state_trace = '{' + ', '.join(sorted(collection[i].name for i in state)) + '}' 
                 print(f"State: {state_trace}")
-            covered_elements = set()
-            for cset in state:
-                covered_elements = covered_elements.union(cset.elements)
 
-            if covered_elements == omega:
-                solution_names = sorted([c.name for c in state])
+            if cp.covers(state):
+                solution_names = sorted([collection[i].name for i in state])
                 if verbose:
                     print(f"Solution found at depth {depth}: {{{', '.join(solution_names)}}}")
-                return state,True
+                return {collection[i] for i in state},True
     # if no soln the return set(),False
-    return set(), False   
+    return no_solution()
     
 
 
 
 
 
+## BestSetCoverIDSLazy is the streaming form of BestSetCoverIDS: it takes the same arguments,
+## returns the same two values, and prints the same trace if verbose is true.
+# Instead of building the list of every state at a depth before checking any of them, the
+# states are produced one at a time by a generator and tested for coverage from the
+# remain_omega threaded through the search, so it stops at the first cover it reaches.
+# trace, if given, is called as trace(depth, state) with each state (a list of CSets) in
+# place of printing the "State:" lines.
+
+def BestSetCoverIDSLazy(problem,budget,verbose,trace=None):
+    cp = compile_problem(problem)
+    collection = cp.collection
+    masks = cp.masks
+    costs = cp.costs
+    # bits a set covers outside omega: they are added to remain_omega and never removed,
+    # so remain_omega is 0 exactly when the chosen sets cover exactly omega
+    outside = [mask & ~cp.omega_mask for mask in masks]
+
+    if verbose and trace is None:
+        def trace(depth, state):
+            print(f"State: {{{', '.join(sorted(c.name for c in state))}}}")
+
+    # dfs generator: yields (selected_sets, remain_omega) for each state at max_depth.
+    # selected_sets is one shared stack of indices, only valid until the next state is asked for
+    def search(remain_omega, selected_sets, start_idx, cur_depth, max_depth, cur_cost):
+        stats['nodes'] += 1
+        if cur_depth == max_depth:
+            yield selected_sets, remain_omega
+            return
+
+        if cur_cost > budget:
+            return
+
+        for i in range(start_idx, len(collection)):
+            if cur_cost + costs[i] > budget:
+                continue
+            selected_sets.append(i)
+            yield from search((remain_omega & ~masks[i]) | outside[i], selected_sets, i + 1, cur_depth + 1, max_depth, cur_cost + costs[i])
+            selected_sets.pop()
+
+    #each depth iteration
+    for depth in range(1, len(collection) + 1):
+        if verbose:
+            print(f"Searching to depth {depth}")
+            print("New States :")
+
+        any_state = False
+        for state, remain_omega in search(cp.omega_mask, [], 0, 0, depth, 0):
+            any_state = True
+            if trace is not None:
+                trace(depth, [collection[i] for i in state])
+            if remain_omega == 0:
+                if verbose:
+                    solution_names = sorted(collection[i].name for i in state)
+                    print(f"Solution found at depth {depth}: {{{', '.join(solution_names)}}}")
+                return {collection[i] for i in state}, True
+
+        if not any_state:
+            if verbose:
+                print(f"Search terminated at depth {depth}")
+            return set(), False
+    return set(), False
+
+
+
+
+
+## BestSetCoverBnB uses depth-first branch and bound to solve an instance of BESTSETCOVER
+## problem, budget and verbose are as in BestSetCoverIDS, and it returns the same two values.
+# Before searching it drops every CSet that is dominated by another CSet covering a superset
+# at no greater cost, and fixes every CSet that is the only one covering some element.
+# Each node branches on the uncovered element with the fewest candidate sets, and is pruned
+# when its cost plus a lower bound on the cost of covering the rest exceeds the budget.
+
+def BestSetCoverBnB(problem,budget,verbose):
+    cp = compile_problem(problem)
+    collection = cp.collection
+    masks = cp.masks
+    costs = cp.costs
+    omega_mask = cp.omega_mask
+
+    def names(indices):
+        return '{' + ', '.join(sorted(collection[i].name for i in indices)) + '}'
+
+    # a set j dominates a set i if it covers everything i covers for no more cost;
+    # ties between identical sets are broken by index so exactly one of them survives
+    def dominates(j, i):
+        if masks[i] & ~masks[j] or costs[j] > costs[i]:
+            return False
+        return costs[j] < costs[i] or masks[j] != masks[i] or j < i
+
+    # sets that cover something outside omega or cost more than the budget can never be used
+    usable = [i for i in range(len(collection))
+              if not masks[i] & ~omega_mask and costs[i] <= budget]
+    candidates = [i for i in usable
+                  if not any(j != i and dominates(j, i) for j in usable)]
+    if verbose:
+        dropped = [i for i in usable if i not in candidates]
+        print(f"Dominated sets removed: {names(dropped)}")
+
+    # an element covered by no candidate makes the problem infeasible,
+    # and an element covered by exactly one candidate fixes that candidate
+    fixed = []
+    rest = omega_mask
+    while rest:
+        bit = rest & -rest
+        rest ^= bit
+        covering = [i for i in candidates if masks[i] & bit]
+        if not covering:
+            if verbose:
+                print("Some element is not covered by any usable set")
+            print("No solution found")
+            return set(), False
+        if len(covering) == 1 and covering[0] not in fixed:
+            fixed.append(covering[0])
+    if verbose:
+        print(f"Fixed sets: {names(fixed)}")
+
+    # lower bound on the cost of covering remain with the allowed sets. In a cover every
+    # uncovered element can be charged to a set S containing it, and S can be charged no more
+    # than cost(S) in total, so charging each element the cheapest share of a set containing
+    # it gives a lower bound. Two shares are tried: cost(S)/|S & remain|, and
+    # cost(S)*cost(e)/cost(S & remain), which is never below cost(e) since a CSet costs the
+    # sum of its elements. Also returns the allowed sets covering the uncovered element with
+    # the fewest of them, cheapest first, or None if some uncovered element cannot be covered.
+    def bound(remain, allowed):
+        sets = []
+        for i in allowed:
+            overlap = masks[i] & remain
+            if overlap:
+                sets.append((i, costs[i] / overlap.bit_count(), cp.uncovered_cost(overlap)))
+        by_count = 0
+        by_cost = 0
+        branch = None
+        rest = remain
+        while rest:
+            bit = rest & -rest
+            rest ^= bit
+            covering = [s for s in sets if masks[s[0]] & bit]
+            if not covering:
+                return None, None
+            by_count += min(share for i, share, weight in covering)
+            weight_e = cp.uncovered_cost(bit)
+            if weight_e:
+                by_cost += min(costs[i] * weight_e / weight for i, share, weight in covering)
+            if branch is None or len(covering) < len(branch):
+                branch = covering
+        return max(by_count, by_cost), sorted((s[0] for s in branch), key=lambda i: (costs[i], i))
+
+    # returns the list of chosen set indices of a cover within budget, or None
+    def search(chosen, covered, cost, allowed):
+        stats['nodes'] += 1
+        remain = omega_mask & ~covered
+        if remain == 0:
+            return chosen
+        lower, branch = bound(remain, allowed)
+        if verbose:
+            print(f"State: {names(chosen)} Cost: {cost} Bound: {lower}")
+        # a small tolerance keeps float rounding in the bound from pruning an exact fit
+        if lower is None or cost + lower - 1e-9 > budget:
+            if verbose:
+                print("Pruned")
+            return None
+        # branch k takes the k-th set and excludes the sets taken by the branches before it
+        for i in branch:
+            allowed = [j for j in allowed if j != i]
+            if cost + costs[i] > budget:
+                continue
+            result = search(chosen + [i], covered | masks[i], cost + costs[i], allowed)
+            if result is not None:
+                return result
+        return None
+
+    fixed_cost = sum(costs[i] for i in fixed)
+    solution = None
+    if fixed_cost <= budget:
+        solution = search(fixed, cp.union(fixed), fixed_cost, [i for i in candidates if i not in fixed])
+
+    if solution is None:
+        print("No solution found")
+        return set(), False
+    print(f"Solution: {names(solution)}")
+    return {collection[i] for i in solution}, True
+
+
+
+
+
 # testHC is a superroutine designed to facilitate debugging of BestSetCoverIDS. It has the
 # extra argument "seed" which initializes the seed for the random number generator,
 # so that you get replicable results
@@ -147,102 +742,412 @@ def testHC(problem,budget,ntries,verbose,seed):
 # 2. A Boolean 
 # It should print out either just the solution, if verbose is false, or a trace of the execution
 # if verbose is true
+## start, if given, is a warm start (a list of CSets, e.g. from greedyCover) used as the
+## starting state of the first attempt in place of a random one
 
-def BestSetCoverHillClimb(problem,budget,ntries,verbose):
+def BestSetCoverHillClimb(problem,budget,ntries,verbose,start=None):
 ## WRITE THE CODE FOR THIS
-    omega, collection = problem()
-    
-    state = []
+    cp = compile_problem(problem)
+    collection = cp.collection
 
-    
-    #error = the budget overrun + sum of costs of the items that are uncovered
-    def error(omega,state,budget):
-        overrun = 0
-        remain = omega.copy()
-        cost = 0
-        remain_cost = 0
-       
-        #costs of unconvered items
-        for cset in state:
-            cost = cost + cset.cost
-            remain = remain - cset.elements
-            
-        remain_cost = sum(element.cost for element in remain)
-        
-        #budget overrun
-        if(cost-budget > 0):
-            overrun = cost - budget         
-        else: overrun = 0
-        
-        err = overrun + remain_cost
-       
-        return err
-    
     #hillclimbing process
     for n in range(ntries):
         state = []
-        #random start state: 50%
-        for i in range(len(collection)):
-            random_value = np.random.randint(2)
-            if random_value == 0:
-                continue
-            else:
-                state.append(collection[i]) 
+        if n == 0 and start is not None:
+            state = cp.indices(start)
+        else:
+            #random start state: 50%
+            for i in range(len(collection)):
+                random_value = np.random.randint(2)
+                if random_value == 0:
+                    continue
+                else:
+                    state.append(i) 
         if verbose:
-            start_name = [c.name for c in state]
+            start_name = [collection[i].name for i in state]
             print(f"Attempt {n} : Starting State:{{{', '.join(start_name)}}}")
-        
-       
-        
-        #if verbose:
-         #   print(f"New iteration.State:{state} Error: {err}")
-          #  print('Neighbors:')
-        start_state = state
-         
-        while(True):
-            
-            neighbors = []
-    
-            err = error(omega,start_state,budget)
+
+        state, err = hillClimb(cp,budget,state,verbose)
+        if err == 0:
+            sol_name = [collection[i].name for i in state]
+            print(f"Solution: State{{{', '.join(sol_name)}}}")
+            return [collection[i] for i in state],True
             
+    print("No solution found")
+    return set(),False
+
+## hillClimb runs one attempt of BestSetCoverHillClimb on the CompiledProblem cp, starting
+## from state (a list of indices into cp.collection), and returns the state it stops in
+## (the same list, changed in place) and its error. It stops as soon as it reaches a state
+## of error 0, or when no neighbor has a lower error than the current state.
+
+def hillClimb(cp,budget,state,verbose):
+    collection = cp.collection
+    current = CoverState(cp,budget,state)
+     
+    while(True):
+
+        err = current.error()
+        
+        if verbose:
+            start_name = [collection[i].name for i in state]
+            print(f"New iteration.State:{{{', '.join(start_name)}}} Error: {err}")
+            print('Neighbors:')
+        #scoring neighbors/return solution/entering a new attempt
+        stats['neighbors'] += len(collection)
+        lowest_err = err
+        best = None
+        for i in range(len(collection)):
+            nbor_err = current.toggled_error(i)
             if verbose:
-                start_name = [c.name for c in start_state]
-                print(f"New iteration.State:{{{', '.join(start_name)}}} Error: {err}")
-                print('Neighbors:')
-            #finding neighbors    
-            for cset in collection:
-                if cset in start_state:
-                    a = start_state.copy()
-                    a.remove(cset)
-                    neighbors.append(a)
-                else:    
-                    a = start_state.copy()
-                    a.append(cset)
-                    neighbors.append(a)
-                    #start_state = state
-           # if verbose:
-              #  for nbor in neighbors:
-                   # nbor_name =[c.name for c in nbor]
-                   # print(f'State :{{{', '.join(nbor_name)}}} Error: {error(omega,nbor,budget)}')
-            #choosing neighbor/return solution/entering a new attempt
-            lowest_err = err
-            for nbor in neighbors:
-                if verbose:
-                    nbor_name =[c.name for c in nbor]
-                    print(f'State :{{{', '.join(nbor_name)}}} Error: {error(omega,nbor,budget)}')
-                nbor_err = error(omega, nbor, budget)
-                if nbor_err < lowest_err:
-                    start_state = nbor
-                    lowest_err = nbor_err
-                if error(omega,start_state,budget) == 0:
-                    sol_name = [c.name for c in start_state]
-                    print(f"Solution: State{{{', '.join(sol_name)}}}")
-                    return start_state,True
-            if error(omega,start_state,budget) >= err:
-                break 
-            
+                if current.in_state[i]:
+                    nbor_name = [collection[j].name for j in state if j != i]
+                else:
+                    nbor_name = [collection[j].name for j in state] + [collection[i].name]
+                print(f"State :{{{', '.join(nbor_name)}}} Error: {nbor_err}")
+            if nbor_err < lowest_err:
+                best = i
+                lowest_err = nbor_err
+            if lowest_err == 0:
+                if best is not None:
+                    current.toggle(best)
+                return state, 0
+        if best is None:
+            return state, err
+        current.toggle(best)
+
+# A CoverState is a state of the local searches with what is needed to score its neighbors
+# incrementally. error = the budget overrun + sum of costs of the items that are uncovered.
+# The state is kept as a list of indices into collection (changed in place), together with
+# in_state (is set i chosen), count (how many chosen sets cover each element), its total
+# cost and the total cost of its uncovered elements, so the error of a neighbor (one set
+# added or removed) only needs to look at that one set.
+# With non-integral costs the running sums would pick up rounding error, so that a cover
+# within budget could end up with an error of 1e-16 instead of 0; the costs and budget are
+# then scaled to exact integers (by the common denominator of their exact values), and errors
+# are handed out as the nearest float. The error of a state is then the same whatever moves
+# led to it. Costs like 0.1 are not exact in binary either, so an overrun of no more than
+# OVERRUN_TOLERANCE times the budget counts as none.
+
+OVERRUN_TOLERANCE = 1e-9
+
+class CoverState:
+    def __init__(self,cp,budget,state):
+        self.cp = cp
+        self.state = state
+        self.exact = not cp.integral
+        self.tolerance = 0
+        if self.exact:
+            values = [Fraction(c) for c in cp.costs + cp.element_costs + [budget]]
+            self.scale = math.lcm(*(v.denominator for v in values))
+            scaled = [int(v * self.scale) for v in values]
+            self.costs = scaled[:len(cp.costs)]
+            self.element_costs = scaled[len(cp.costs):-1]
+            self.budget = scaled[-1]
+            self.tolerance = int(OVERRUN_TOLERANCE * abs(self.budget))
+        else:
+            self.budget = budget
+            self.costs = cp.costs
+            self.element_costs = cp.element_costs
+        self.in_state = [False] * len(cp.collection)
+        self.count = [0] * len(cp.elements)
+        self.cost = 0
+        for i in state:
+            self.in_state[i] = True
+            self.cost = self.cost + self.costs[i]
+            for e in cp.members[i]:
+                self.count[e] += 1
+        self.uncovered = sum(self.element_costs[e] for e in range(len(cp.omega)) if self.count[e] == 0)
+
+    def overrun(self,cost):
+        if(cost-self.budget > self.tolerance):
+            return cost - self.budget
+        else: return 0
+
+    def _value(self,err):
+        if self.exact:
+            return err / self.scale
+        return err
+
+    def error(self):
+        return self._value(self.overrun(self.cost) + self.uncovered)
+
+    #uncovered cost of the neighbor that toggles set i
+    def toggled_uncovered(self,i):
+        members = self.cp.members[i]
+        element_costs = self.element_costs
+        if self.in_state[i]:
+            return self.uncovered + sum(element_costs[e] for e in members if self.count[e] == 1)
+        return self.uncovered - sum(element_costs[e] for e in members if self.count[e] == 0)
+
+    #error of the neighbor that toggles set i
+    def toggled_error(self,i):
+        if self.in_state[i]:
+            return self._value(self.overrun(self.cost - self.costs[i]) + self.toggled_uncovered(i))
+        return self._value(self.overrun(self.cost + self.costs[i]) + self.toggled_uncovered(i))
+
+    #add or remove set i in place
+    def toggle(self,i):
+        self.uncovered = self.toggled_uncovered(i)
+        if self.in_state[i]:
+            self.state.remove(i)
+            self.cost = self.cost - self.costs[i]
+            for e in self.cp.members[i]:
+                self.count[e] -= 1
+        else:
+            self.state.append(i)
+            self.cost = self.cost + self.costs[i]
+            for e in self.cp.members[i]:
+                self.count[e] += 1
+        self.in_state[i] = not self.in_state[i]
+
+## BestSetCoverHillClimbParallel runs the ntries restarts of BestSetCoverHillClimb across a
+## pool of worker processes (os.cpu_count() of them if workers is None).
+## Restart n starts from a state drawn with its own np.random.Generator, seeded with the n-th
+## child of np.random.SeedSequence(seed), so the result depends only on seed: it is the
+## solution of the lowest-numbered restart that reaches error 0, whatever the number of workers.
+## Once restart n succeeds no restart numbered above n is started, and the others still running
+## only finish, so the answer is the one a sequential run over the same seeds would give.
+## It returns the same two values as BestSetCoverHillClimb; with verbose it prints the final
+## error of each restart that ran, in order, instead of the full trace.
+
+def BestSetCoverHillClimbParallel(problem,budget,ntries,verbose,seed,workers=None):
+    cp = compile_problem(problem)
+    collection = cp.collection
+    seeds = np.random.SeedSequence(seed).spawn(ntries)
+    if workers is None:
+        workers = os.cpu_count()
+
+    #restarts are handed out in blocks, several per worker, to keep the per-task overhead low
+    block = max(1, ntries // (workers * 8))
+    #lowest restart number known to have succeeded, shared with the workers
+    solved = multiprocessing.Value('q', ntries)
+
+    tried = []
+    solution = None
+    pool = ProcessPoolExecutor(workers, initializer=_hcWorkerInit, initargs=(cp, budget, solved))
+    try:
+        futures = [pool.submit(_hcWorkerRun, first, seeds[first:first + block])
+                   for first in range(0, ntries, block)]
+        #blocks are collected in order, so the first solution seen is the lowest-numbered one
+        for future in futures:
+            block_tried, state, neighbors = future.result()
+            tried.extend(block_tried)
+            stats['neighbors'] += neighbors
+            if state is not None:
+                solution = state
+                break
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+    if verbose:
+        for n, err in tried:
+            print(f"Attempt {n} : Error: {err}")
+    if solution is not None:
+        sol_name = [collection[i].name for i in solution]
+        print(f"Solution: State{{{', '.join(sol_name)}}}")
+        return [collection[i] for i in solution],True
     print("No solution found")
     return set(),False
+
+#state of a BestSetCoverHillClimbParallel worker process, set once when it starts
+#so the instance is not sent again with every block of restarts
+_hc_worker = {}
+
+def _hcWorkerInit(cp,budget,solved):
+    _hc_worker['cp'] = cp
+    _hc_worker['budget'] = budget
+    _hc_worker['solved'] = solved
+
+#runs restarts first, first+1, ... with the given seeds until one reaches error 0;
+#returns the (restart, error) pairs it ran, the solution state or None,
+#and the number of neighbors it scored
+def _hcWorkerRun(first,seeds):
+    cp = _hc_worker['cp']
+    solved = _hc_worker['solved']
+    neighbors = stats['neighbors']
+    tried = []
+    for n, seed in enumerate(seeds, first):
+        if n > solved.value:
+            break
+        rng = np.random.default_rng(seed)
+        state = [i for i in range(len(cp.collection)) if rng.integers(2)]
+        state, err = hillClimb(cp, _hc_worker['budget'], state, False)
+        tried.append((n, err))
+        if err == 0:
+            with solved.get_lock():
+                if n < solved.value:
+                    solved.value = n
+            return tried, state, stats['neighbors'] - neighbors
+    return tried, None, stats['neighbors'] - neighbors
+
+
+## BestSetCoverHillClimbVectorized is BestSetCoverHillClimb with neighbors scored by an
+## ArrayProblem: it climbs batch restarts at once, each step scoring the whole neighborhood of
+## every state in the batch in one call. Start states are drawn from np.random in the same
+## order as BestSetCoverHillClimb and each climb makes the same moves, so for the same seed it
+## returns the same solution. With verbose it climbs one restart at a time and prints the
+## same trace as BestSetCoverHillClimb.
+
+def BestSetCoverHillClimbVectorized(problem,budget,ntries,verbose,batch=64):
+    cp = compile_problem(problem)
+    ap = ArrayProblem(cp)
+    collection = cp.collection
+    if verbose:
+        batch = 1
+
+    for first in range(0, ntries, batch):
+        size = min(batch, ntries - first)
+        states = np.zeros((size, len(collection)), dtype=bool)
+        #the order of the sets in each state, as BestSetCoverHillClimb keeps it
+        orders = []
+        for b in range(size):
+            #random start state: 50%
+            order = [i for i in range(len(collection)) if np.random.randint(2) != 0]
+            states[b, order] = True
+            orders.append(order)
+            if verbose:
+                start_name = [collection[i].name for i in order]
+                print(f"Attempt {first + b} : Starting State:{{{', '.join(start_name)}}}")
+
+        #status of each climb: 0 still climbing, 1 reached error 0, -1 stopped at a local minimum
+        status = np.zeros(size, dtype=int)
+        while True:
+            running = np.flatnonzero(status == 0)
+            if len(running) == 0:
+                break
+            err = ap.errors(states[running], budget)
+            nbor_err = ap.neighbor_errors(states[running], budget)
+            stats['neighbors'] += nbor_err.size
+            #first neighbor of lowest error, as in the sequential scan
+            best = nbor_err.argmin(axis=1)
+            lowest_err = nbor_err[np.arange(len(running)), best]
+            improved = lowest_err < err - ap.tolerance(budget)
+            if verbose:
+                _traceVectorized(collection, orders[0], err[0], nbor_err[0].tolist())
+            for r, b in enumerate(running):
+                if improved[r]:
+                    i = int(best[r])
+                    states[b, i] = not states[b, i]
+                    if states[b, i]:
+                        orders[b].append(i)
+                    else:
+                        orders[b].remove(i)
+                if err[r] == 0 or (improved[r] and lowest_err[r] == 0):
+                    status[b] = 1
+                elif not improved[r]:
+                    status[b] = -1
+            #the answer is the lowest-numbered restart that succeeds, so stop as soon as
+            #every restart before it has finished
+            unfinished = np.flatnonzero(status != -1)
+            if len(unfinished) > 0 and status[unfinished[0]] == 1:
+                solution = orders[unfinished[0]]
+                sol_name = [collection[i].name for i in solution]
+                print(f"Solution: State{{{', '.join(sol_name)}}}")
+                return [collection[i] for i in solution],True
+
+    print("No solution found")
+    return set(),False
+
+#prints one iteration of the BestSetCoverHillClimb trace for the state with set order order,
+#stopping after the neighbor at which the sequential scan would have found error 0
+def _traceVectorized(collection,order,err,nbor_errs):
+    print(f"New iteration.State:{{{', '.join(collection[i].name for i in order)}}} Error: {err}")
+    print('Neighbors:')
+    lowest_err = err
+    for i, nbor_err in enumerate(nbor_errs):
+        if i in order:
+            nbor_name = [collection[j].name for j in order if j != i]
+        else:
+            nbor_name = [collection[j].name for j in order] + [collection[i].name]
+        print(f"State :{{{', '.join(nbor_name)}}} Error: {nbor_err}")
+        lowest_err = min(lowest_err, nbor_err)
+        if lowest_err == 0:
+            return
+
+## BestSetCoverAnneal uses simulated annealing on the error of BestSetCoverHillClimb to solve
+## the BEST SET COVER problem, as an anytime alternative to restarting from scratch.
+## Each step toggles a random set, keeping the move if it does not make the error worse, and
+## otherwise with probability exp(-increase/temperature), the temperature cooling
+## geometrically from the mean set cost down to a thousandth of it as the budget is used up.
+## It stops at the first state of error 0, or when seconds of wall-clock time or evaluations
+## neighbor evaluations are used up (whichever comes first; at least one must be given).
+## It returns the best state found: (solution, True) if its error is 0, and otherwise
+## (best state, False), both as lists of CSets.
+## seed seeds its np.random.Generator (so with an evaluation budget a run is reproducible),
+## start is a warm start as in BestSetCoverHillClimb (a random state is used otherwise), and
+## report, if given, is a dict that is filled with convergence stats: 'evaluations',
+## 'accepted' (moves kept), 'seconds', 'best_error', and 'history', the list of
+## (evaluations, seconds, error) at each new best state.
+## With verbose it prints each new best state's error.
+
+def BestSetCoverAnneal(problem,budget,verbose,seconds=None,evaluations=None,seed=None,start=None,report=None):
+    if seconds is None and evaluations is None:
+        raise ValueError("BestSetCoverAnneal needs a time budget, an evaluation budget or both")
+    cp = compile_problem(problem)
+    collection = cp.collection
+    rng = np.random.default_rng(seed)
+
+    if start is not None:
+        state = cp.indices(start)
+    else:
+        state = [i for i in range(len(collection)) if rng.integers(2)]
+    current = CoverState(cp,budget,state)
+    err = current.error()
+    best_err, best_state = err, list(state)
+
+    t_start = max(sum(cp.costs) / max(len(collection), 1), 1e-9)
+    t_end = t_start / 1000
+    temperature = t_start
+    began = time.perf_counter()
+    history = [(0, 0.0, err)]
+    evals = 0
+    accepted = 0
+    block = 64
+    done = best_err == 0 or len(collection) == 0
+    while not done:
+        #the clock and the temperature are updated once per block of moves
+        elapsed = time.perf_counter() - began
+        progress = 0
+        if seconds is not None:
+            progress = elapsed / seconds
+        if evaluations is not None:
+            progress = max(progress, evals / evaluations)
+        if progress >= 1:
+            break
+        temperature = t_start * (t_end / t_start) ** progress
+        moves = rng.integers(len(collection), size=block)
+        coins = rng.random(block)
+        for i, coin in zip(moves.tolist(), coins.tolist()):
+            if evaluations is not None and evals >= evaluations:
+                break
+            nbor_err = current.toggled_error(i)
+            evals += 1
+            if nbor_err <= err or coin < math.exp((err - nbor_err) / temperature):
+                current.toggle(i)
+                err = nbor_err
+                accepted += 1
+                if err < best_err:
+                    best_err, best_state = err, list(state)
+                    history.append((evals, time.perf_counter() - began, err))
+                    if verbose:
+                        print(f"Evaluation {evals}: Error: {err} Temperature: {temperature:.4g}")
+                    if err == 0:
+                        done = True
+                        break
+    stats['neighbors'] += evals
+
+    if report is not None:
+        report.update(evaluations=evals, accepted=accepted, seconds=time.perf_counter() - began,
+                      best_error=best_err, history=history)
+    best_name = [collection[i].name for i in best_state]
+    if best_err == 0:
+        print(f"Solution: State{{{', '.join(best_name)}}}")
+        return [collection[i] for i in best_state],True
+    print(f"No solution found. Best state: {{{', '.join(best_name)}}} Error: {best_err}")
+    return [collection[i] for i in best_state],False
+
 #Testing
-#BestSetCoverIDS(problem1, 30, True)
-testHC(problem1,30,3,True,1)
\ No newline at end of file
+if __name__ == '__main__':
+    #BestSetCoverIDS(problem1, 30, True)
+    testHC(problem1,30,3,True,1)
\ No newline at end of file
@@ -1,15 +1,62 @@
+import os
 import sys
+import json
+import struct
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from math import log2
+from zlib import crc32
+from itertools import islice
 from collections import defaultdict
-from typing import List, Dict, Set, Tuple
+from typing import List, Dict, Set, Tuple, Iterable, Iterator, TextIO, Union, Optional
+
+import numpy as np
+
+# A saved model file is MODEL_MAGIC, then the length of a UTF-8 JSON header
+# (labels, number of terms, length of the vocabulary) as a little-endian uint64,
+# the header, the vocabulary (terms in column order, newline-separated, UTF-8),
+# padding to a multiple of 8 bytes, and then the float64 arrays of label
+# log-priors and label x term log-probabilities, which are memory-mapped on load.
+# A model with hash_features has no vocabulary: its columns are hash buckets.
+MODEL_MAGIC = b'DOCCLF01'
+
+FEATURE_SELECTIONS = ('chi2', 'information_gain')
+
+class DefaultTable(dict):
+    # a label's probability table holding only the terms seen with the label;
+    # every other term has the same value, which is returned without being stored
+
+    def __init__(self, default: float):
+        super().__init__()
+        self.default = default
+
+    def __missing__(self, key):
+        return self.default
 
 class DocumentClassifier:
     
-    def __init__(self):
+    def __init__(self, vectorized: bool = False, epsilon: float = 0.1, min_df: int = 1,
+                 max_features: Optional[int] = None, feature_selection: str = 'chi2',
+                 hash_features: int = 0):
+        # vocabulary controls: training keeps only the terms in at least min_df
+        # training documents and, if max_features is set, the max_features of them
+        # scoring highest on feature_selection. With hash_features > 0 there is no
+        # vocabulary: terms are hashed into that many columns of the (vectorized) model.
+        if feature_selection not in FEATURE_SELECTIONS:
+            raise ValueError(f"feature_selection must be one of {', '.join(FEATURE_SELECTIONS)}")
+        if hash_features and (min_df > 1 or max_features is not None):
+            raise ValueError("hash_features cannot be combined with min_df or max_features")
+        self.vectorized = vectorized or bool(hash_features)
+        self.epsilon = epsilon
+        self.min_df = min_df
+        self.max_features = max_features
+        self.feature_selection = feature_selection
+        self.hash_features = hash_features
         self.label_counts = defaultdict(int)
         self.token_counts = defaultdict(lambda: defaultdict(int))
 
-        self.stop_words = {
+        stop_words = {
             'about', 'all', 'along', 'also', 'although', 'among', 'and', 'any', 'anyone', 
             'anything', 'are', 'around', 'because', 'been', 'before', 'being', 'both', 
             'but', 'came', 'come', 'coming', 'could', 'did', 'each', 'else', 'every', 
@@ -35,70 +82,123 @@ class DocumentClassifier:
             'millions'
         }
 
-        self.stop_words.update(chr(i) for i in range(97, 123))
+        stop_words.update(chr(i) for i in range(97, 123))
         
-        self.stop_words.update(chr(i) + chr(j) for i in range(97, 123) for j in range(97, 123))
+        stop_words.update(chr(i) + chr(j) for i in range(97, 123) for j in range(97, 123))
+
+        stop_words.update({'and', 'a', 'an', 'the', 'us', 'of', 'in', 'at', 'to'})
+
+        self.stop_words = frozenset(stop_words)
 
         self.labels = set()
         self.terms = set()
 
+        self.term_index = {}
+        self.id_counts = {}
+
+        self.num_documents = 0
+        self.token_probs = {}
+        self.log_token_probs = {}
+        # set whenever the counts change after the probability arrays were built, in
+        # either mode: save_model builds arrays for dict models too
+        self._arrays_stale = False
+
     def _clean_text(self, raw_text: str) -> List[str]:
-        raw_text = raw_text.lower()
-        raw_text = raw_text.replace(',', ' ').replace('.', ' ').replace('  ', ' ')
+        stop_words = self.stop_words
+        return [token for token in raw_text.lower().replace(',', ' ').replace('.', ' ').split()
+                if token not in stop_words
+                and len(token) > 1
+                and not token.isdigit()]
+
+    def clean_lines(self, lines: List[str]) -> List[List[str]]:
+        # the tokens of many lines at once: the lowercasing and punctuation pass
+        # runs once over all of them
+        stop_words = self.stop_words
+        text = '\n'.join(lines).lower().replace(',', ' ').replace('.', ' ')
+        return [[token for token in line.split()
+                 if token not in stop_words
+                 and len(token) > 1
+                 and not token.isdigit()]
+                for line in text.split('\n')]
+
+    def term_ids(self, tokens: Iterable[str], grow_vocabulary: bool) -> np.ndarray:
+        # the distinct vocabulary ids of tokens; new terms get new ids if
+        # grow_vocabulary, and are dropped otherwise
+        if self.hash_features:
+            return self._hashed_ids(tokens)
+        ids = set()
+        term_index = self.term_index
+        for token in tokens:
+            term_id = term_index.get(token)
+            if term_id is None:
+                if not grow_vocabulary:
+                    continue
+                term_id = term_index[token] = len(term_index)
+            ids.add(term_id)
+        return np.fromiter(ids, dtype=np.int64, count=len(ids))
 
-        tokens = raw_text.split()
+    def _hashed_ids(self, tokens: Iterable[str]) -> np.ndarray:
+        # the distinct hash buckets of tokens; crc32 rather than hash() so that the
+        # buckets are the same in every process and in saved models
+        buckets = {crc32(token.encode('utf-8')) % self.hash_features for token in tokens}
+        return np.fromiter(buckets, dtype=np.int64, count=len(buckets))
 
-        additional_stopwords = {'and', 'a', 'an', 'the', 'us', 'of', 'in', 'at', 'to'}
-        self.stop_words.update(additional_stopwords)
+    def _parse_corpus(self, lines: Iterable[str]) -> Iterator[Dict]:
+        current_doc = {}
+        current_tokens = []
+        # body lines are tokenised together when the document's blank line is reached
+        body_lines = []
 
-        filtered_tokens = [token.strip() for token in tokens
-                           if token not in self.stop_words
-                           and len(token) > 1
-                           and not token.isdigit()]
+        for line in lines:
+            line = line.strip()
 
-        return filtered_tokens
+            if not line and body_lines:
+                for cleaned_tokens in self.clean_lines(body_lines):
+                    current_tokens.extend(cleaned_tokens)
+                body_lines = []
+
+            if not line and current_tokens:
+                current_doc['tokens'] = current_tokens
+                yield current_doc
+                current_doc = {}
+                current_tokens = []
+                continue
+
+            if not line:
+                continue
+
+            if 'name' not in current_doc:
+                current_doc['name'] = line
+            elif 'label' not in current_doc:
+                current_doc['label'] = line
+            else:
+                body_lines.append(line)
+
+        for cleaned_tokens in self.clean_lines(body_lines):
+            current_tokens.extend(cleaned_tokens)
+        if current_tokens:
+            current_doc['tokens'] = current_tokens
+            yield current_doc
 
     def load_corpus(self, filename: str, train_size: int) -> Tuple[List[Dict], List[Dict]]:
         documents = []
-        current_doc = {}
-        current_tokens = []
 
         try:
             with open(filename, 'r') as file:
-                lines = file.readlines()
-
-            for line in lines:
-                line = line.strip()
-
-                if not line and current_tokens:
-                    current_doc['text'] = ' '.join(token for token in current_tokens)
-                    documents.append(current_doc)
-                    current_doc = {}
-                    current_tokens = []
-                    continue
-
-                if not line:
-                    continue
-
-                if 'name' not in current_doc:
-                    current_doc['name'] = line
-                elif 'label' not in current_doc:
-                    current_doc['label'] = line
-                    self.labels.add(line)
-                else:
-                    cleaned_tokens = self._clean_text(line)
-                    current_tokens.extend(cleaned_tokens)
-
-            if current_tokens:
-                current_doc['text'] = ' '.join(current_tokens)
-                documents.append(current_doc)
+                for doc in self._parse_corpus(file):
+                    self.labels.add(doc['label'])
+                    doc['text'] = ' '.join(doc.pop('tokens'))
+                    documents.append(doc)
 
             training_set = documents[:train_size]
-            self.terms = set()
+            # a model that has already been trained keeps its vocabulary
+            if not self.num_documents:
+                self.terms = set()
 
-            for doc in training_set:
-                tokens = doc['text'].split()
-                self.terms.update(tokens)
+            if not self.hash_features:
+                for doc in training_set:
+                    tokens = doc['text'].split()
+                    self.terms.update(tokens)
 
             return training_set, documents[train_size:]
 
@@ -106,16 +206,77 @@ class DocumentClassifier:
             print(f"Error: Corpus file '{filename}' not found.")
             sys.exit(1)
 
+    def iter_corpus(self, source: Union[str, TextIO]) -> Iterator[Dict]:
+        # documents of a corpus file ('-' for stdin) or open text stream, one at a
+        # time, as dicts with 'name', 'label' and 'tokens'
+        if not isinstance(source, str):
+            yield from self._parse_corpus(source)
+        elif source == '-':
+            yield from self._parse_corpus(sys.stdin)
+        else:
+            with open(source, 'r') as file:
+                yield from self._parse_corpus(file)
+
+    def with_term_ids(self, documents: Iterable[Dict], grow_vocabulary: bool) -> Iterator[Dict]:
+        # replaces each document's tokens by 'ids', the array of its distinct term ids;
+        # new terms get new ids if grow_vocabulary, and are dropped otherwise
+        for doc in documents:
+            doc['ids'] = self.term_ids(doc.pop('tokens'), grow_vocabulary)
+            yield doc
+
+    def train_stream(self, training_docs: Iterable[Dict]):
+        # trains from documents with term ids, keeping only the label x term counts
+        for doc in training_docs:
+            label = doc['label']
+            self.labels.add(label)
+            self.label_counts[label] += 1
+            num_terms = self.hash_features or len(self.term_index)
+            counts = self.id_counts.get(label)
+            if counts is None or len(counts) < num_terms:
+                grown = np.zeros(max(num_terms, 2 * len(counts) if counts is not None else 0))
+                if counts is not None:
+                    grown[:len(counts)] = counts
+                counts = self.id_counts[label] = grown
+            counts[doc['ids']] += 1
+            self.num_documents += 1
+
+        self.vectorized = True
+        self.label_list = list(self.labels)
+        num_terms = self.hash_features or len(self.term_index)
+        counts = np.zeros((len(self.label_list), num_terms))
+        for row, label in enumerate(self.label_list):
+            label_counts = self.id_counts[label][:num_terms]
+            counts[row, :len(label_counts)] = label_counts
+
+        selected = self._selected_terms(counts, self.num_documents)
+        if selected is not None:
+            # pruned terms lose their ids; the kept ones are renumbered in order
+            terms = sorted(self.term_index, key=self.term_index.get)
+            self.term_index = {terms[column]: i for i, column in enumerate(selected)}
+            counts = counts[:, selected]
+            for row, label in enumerate(self.label_list):
+                self.id_counts[label] = counts[row].copy()
+        self._set_probability_arrays(counts, self.num_documents)
+
+    def classify_stream(self, test_docs: Iterable[Dict],
+                        batch_size: int = 1000) -> Iterator[Tuple[str, str, str, Dict[str, float]]]:
+        while True:
+            batch = list(islice(test_docs, batch_size))
+            if not batch:
+                return
+            yield from self._classify_documents_vectorized(batch)
+
     def compute_counts(self, training_set: List[Dict]):
         for doc in training_set:
             label = doc['label']
+            self.num_documents += 1
             self.label_counts[label] += 1
             unique_tokens = set(doc['text'].split())
             for token in unique_tokens:
                 self.token_counts[label][token] += 1
 
     def calculate_probabilities(self, training_set: List[Dict]):
-        e = 0.1 #epsilon
+        e = self.epsilon
         num_labels = len(self.labels)
 
         total_docs = len(training_set)
@@ -139,8 +300,147 @@ class DocumentClassifier:
         for label in self.labels:
             for token in self.terms:
                 self.log_token_probs[label][token] = -log2(self.token_probs[label][token])
+        self._arrays_stale = True
+
+    def prune_vocabulary(self):
+        # applies min_df and max_features to self.terms, using the counts of the
+        # documents trained on so far
+        if self.min_df <= 1 and self.max_features is None:
+            return
+        self._build_index()
+        selected = self._selected_terms(self._count_array(), self.num_documents)
+        terms = sorted(self.term_index, key=self.term_index.get)
+        self.terms = {terms[column] for column in selected}
+
+    def _selected_terms(self, counts: np.ndarray, num_docs: int) -> Optional[np.ndarray]:
+        # the columns of the label x term counts (rows in label_list order) kept by
+        # min_df and max_features, in increasing order, or None if nothing is pruned
+        if self.min_df <= 1 and self.max_features is None:
+            return None
+        selected = np.flatnonzero(counts.sum(axis=0) >= self.min_df)
+        if self.max_features is not None and len(selected) > self.max_features:
+            label_counts = np.array([self.label_counts[label] for label in self.label_list], dtype=float)
+            scores = _feature_scores(counts[:, selected], label_counts, num_docs, self.feature_selection)
+            best = np.argsort(-scores, kind='stable')[:self.max_features]
+            selected = np.sort(selected[best])
+        return selected
+
+    def _build_index(self):
+        self.label_list = list(self.labels)
+        self.term_index = {term: i for i, term in enumerate(self.terms)}
+
+    def calculate_probability_arrays(self, training_set: List[Dict]):
+        self._build_index()
+        self._set_probability_arrays(self._count_array(), len(training_set))
+
+    def _count_array(self) -> np.ndarray:
+        counts = np.zeros((len(self.label_list), len(self.term_index)))
+        for row, label in enumerate(self.label_list):
+            for token, count in self.token_counts[label].items():
+                column = self.term_index.get(token)
+                if column is not None:
+                    counts[row, column] = count
+        return counts
+
+    def _set_probability_arrays(self, counts: np.ndarray, total_docs: int):
+        label_counts = np.array([self.label_counts[label] for label in self.label_list], dtype=float)
+        self.log_label_array, self.log_token_array = _log_probabilities(
+            label_counts, counts, total_docs, self.epsilon)
+        self._arrays_stale = False
+
+    def _ensure_arrays(self):
+        if self._arrays_stale or not hasattr(self, 'log_token_array'):
+            self._build_index()
+            self._set_probability_arrays(self._count_array(), self.num_documents)
+
+    def save_model(self, filename: str):
+        self._ensure_arrays()
+        num_terms = self.log_token_array.shape[1]
+        terms = sorted(self.term_index, key=self.term_index.get)[:num_terms]
+        vocabulary = '\n'.join(terms).encode('utf-8')
+        header = json.dumps({'labels': self.label_list, 'num_terms': num_terms,
+                             'vocabulary_bytes': len(vocabulary),
+                             'hash_features': self.hash_features}).encode('utf-8')
+
+        with open(filename, 'wb') as file:
+            file.write(MODEL_MAGIC)
+            file.write(struct.pack('<Q', len(header)))
+            file.write(header)
+            file.write(vocabulary)
+            file.write(b'\0' * (-file.tell() % 8))
+            file.write(np.ascontiguousarray(self.log_label_array, dtype='<f8').tobytes())
+            file.write(np.ascontiguousarray(self.log_token_array, dtype='<f8').tobytes())
+
+    @classmethod
+    def load_model(cls, filename: str) -> 'DocumentClassifier':
+        # a vectorized classifier whose probability arrays are read-only memory maps
+        # of the file, so processes scoring with the same model share its pages
+        with open(filename, 'rb') as file:
+            if file.read(len(MODEL_MAGIC)) != MODEL_MAGIC:
+                raise ValueError(f"{filename} is not a saved DocumentClassifier model")
+            header_size, = struct.unpack('<Q', file.read(8))
+            header = json.loads(file.read(header_size).decode('utf-8'))
+            vocabulary = file.read(header['vocabulary_bytes']).decode('utf-8')
+            offset = file.tell() + (-file.tell() % 8)
+
+        classifier = cls(vectorized=True, hash_features=header.get('hash_features', 0))
+        classifier.label_list = header['labels']
+        classifier.labels = set(classifier.label_list)
+        num_labels, num_terms = len(classifier.label_list), header['num_terms']
+        terms = vocabulary.split('\n') if num_terms and not classifier.hash_features else []
+        classifier.term_index = {term: i for i, term in enumerate(terms)}
+        classifier.terms = set(terms)
+        classifier.log_label_array = np.memmap(filename, dtype='<f8', mode='r',
+                                               offset=offset, shape=(num_labels,))
+        classifier.log_token_array = np.memmap(filename, dtype='<f8', mode='r',
+                                               offset=offset + 8 * num_labels,
+                                               shape=(num_labels, num_terms))
+        return classifier
+
+    def _document_term_matrix(self, docs: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        # sparse binary document x term matrix in CSR form: the term ids of row i
+        # are columns[offsets[i]:offsets[i + 1]]
+        columns = []
+        offsets = [0]
+        num_terms = self.log_token_array.shape[1]
+        for doc in docs:
+            if 'ids' in doc:
+                ids = doc['ids'][doc['ids'] < num_terms]
+            elif self.hash_features:
+                ids = self._hashed_ids(doc['text'].split())
+            else:
+                ids = {self.term_index[token] for token in doc['text'].split() if token in self.term_index}
+            columns.extend(ids)
+            offsets.append(len(columns))
+        return np.array(columns, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+    def score_documents(self, docs: List[Dict]) -> np.ndarray:
+        columns, offsets = self._document_term_matrix(docs)
+        return _sparse_scores(columns, offsets, self.log_token_array, self.log_label_array)
+
+    def _classify_documents_vectorized(self, test_set: List[Dict],
+                                       batch_size: int = 10000) -> List[Tuple[str, str, str, Dict[str, float]]]:
+        self._ensure_arrays()
+
+        results = []
+
+        for start in range(0, len(test_set), batch_size):
+            batch = test_set[start:start + batch_size]
+            scores = self.score_documents(batch)
+            best = scores.argmin(axis=1)
+            exponents = 2 ** (scores.min(axis=1)[:, None] - scores)
+            probabilities = exponents / exponents.sum(axis=1)[:, None]
+
+            for doc, predicted, probs in zip(batch, best.tolist(), probabilities.tolist()):
+                results.append((doc['name'], doc['label'], self.label_list[predicted],
+                                dict(zip(self.label_list, probs))))
+
+        return results
 
     def classify_documents(self, test_set: List[Dict]) -> List[Tuple[str, str, str, Dict[str, float]]]:
+        if self.vectorized:
+            return self._classify_documents_vectorized(test_set)
+
         results = []
 
         for doc in test_set:
@@ -170,37 +470,381 @@ class DocumentClassifier:
 
         return results
 
+    def partial_fit(self, documents: List[Dict]):
+        # online training: adds the documents to the counts and the vocabulary, and
+        # updates the probabilities of the labels they belong to
+        if self.hash_features:
+            self.train_stream(self._hashed_documents(documents))
+            return
+        updated = set()
+        for doc in documents:
+            self.labels.add(doc['label'])
+            self.terms.update(doc['text'].split())
+            updated.add(doc['label'])
+
+        self.compute_counts(documents)
+        self._update_probabilities(updated)
+
+    def count_tables(self) -> Tuple[Dict[str, int], Dict[str, Dict[str, int]], int]:
+        # plain (picklable) copies of the label counts, the label x token counts
+        # and the number of documents counted
+        token_counts = {label: dict(counts) for label, counts in self.token_counts.items()}
+        return dict(self.label_counts), token_counts, self.num_documents
+
+    def merge_counts(self, label_counts: Dict[str, int], token_counts: Dict[str, Dict[str, int]],
+                     num_documents: int):
+        # adds count tables from count_tables() of a model trained on other documents
+        self._add_counts(label_counts, token_counts, num_documents)
+        self._update_probabilities(set(label_counts) | set(token_counts))
+
+    def _add_counts(self, label_counts: Dict[str, int], token_counts: Dict[str, Dict[str, int]],
+                    num_documents: int):
+        for label, count in label_counts.items():
+            self.labels.add(label)
+            self.label_counts[label] += count
+        for label, counts in token_counts.items():
+            label_token_counts = self.token_counts[label]
+            for token, count in counts.items():
+                label_token_counts[token] += count
+            self.terms.update(counts)
+        self.num_documents += num_documents
+
+    def merge(self, other: 'DocumentClassifier'):
+        self.merge_counts(*other.count_tables())
+
+    def _update_probabilities(self, updated: Set[str]):
+        e = self.epsilon
+        num_labels = len(self.labels)
+
+        total_docs = self.num_documents
+        self.label_probs = {}
+        for label in self.labels:
+            frequency = self.label_counts[label] / total_docs
+            self.label_probs[label] = (frequency + e ) / (1 + num_labels * e )
+
+        self.log_label_probs = {
+            label: -log2(prob) for label, prob in self.label_probs.items()
+        }
+
+        # a term never seen with a label has probability e / (1 + 2e) whatever the label's
+        # count, so only the seen terms of labels with new documents need recomputing.
+        # Tables from a full train() hold every term and are replaced the first time.
+        unseen = e / (1 + 2 * e)
+        for label in self.labels:
+            if label not in updated and isinstance(self.log_token_probs.get(label), DefaultTable):
+                continue
+            label_count = self.label_counts[label]
+            token_probs = DefaultTable(unseen)
+            log_token_probs = DefaultTable(-log2(unseen))
+            for token, count in self.token_counts[label].items():
+                prob = (count / label_count + e ) / (1 + 2 * e )
+                token_probs[token] = prob
+                log_token_probs[token] = -log2(prob)
+            self.token_probs[label] = token_probs
+            self.log_token_probs[label] = log_token_probs
+
+        self._arrays_stale = True
+
+    def cross_validate(self, documents: List[Dict], folds: int,
+                       epsilons: List[float]) -> Dict[float, float]:
+        # k-fold cross-validation accuracy of every epsilon in epsilons. The documents
+        # are tokenised and each fold's label x term counts computed once; a fold's
+        # training counts are the totals minus its own, and only the log-probabilities
+        # are recomputed for each epsilon. Folds are contiguous, like train_size's split.
+        if not 2 <= folds <= len(documents):
+            raise ValueError(f"cannot split {len(documents)} documents into {folds} folds")
+
+        label_list = sorted({doc['label'] for doc in documents})
+        label_index = {label: i for i, label in enumerate(label_list)}
+        num_labels = len(label_list)
+        term_index = {}
+        columns = []
+        offsets = [0]
+        for doc in documents:
+            columns.extend({term_index.setdefault(token, len(term_index)) for token in doc['text'].split()})
+            offsets.append(len(columns))
+        columns = np.array(columns, dtype=np.int64)
+        offsets = np.array(offsets, dtype=np.int64)
+        labels = np.array([label_index[doc['label']] for doc in documents], dtype=np.int64)
+        cells = np.repeat(labels, np.diff(offsets)) * len(term_index) + columns
+
+        bounds = np.linspace(0, len(documents), folds + 1).astype(int)
+        fold_counts = []
+        fold_label_counts = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            fold_cells = cells[offsets[start]:offsets[end]]
+            fold_counts.append(np.bincount(fold_cells, minlength=num_labels * len(term_index))
+                               .reshape(num_labels, len(term_index)).astype(float))
+            fold_label_counts.append(np.bincount(labels[start:end], minlength=num_labels).astype(float))
+        total_counts = sum(fold_counts)
+        total_label_counts = sum(fold_label_counts)
+
+        correct = dict.fromkeys(epsilons, 0)
+        for fold, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            counts = total_counts - fold_counts[fold]
+            label_counts = total_label_counts - fold_label_counts[fold]
+            # as when training on the other folds alone: labels without documents there
+            # cannot be predicted, and terms not seen there are ignored
+            trained = np.flatnonzero(label_counts)
+            unseen_terms = counts.sum(axis=0) == 0
+            counts = counts[trained]
+            label_counts = label_counts[trained]
+            fold_columns = columns[offsets[start]:offsets[end]]
+            fold_offsets = offsets[start:end + 1] - offsets[start]
+            for e in epsilons:
+                log_label_array, log_token_array = _log_probabilities(
+                    label_counts, counts, len(documents) - (end - start), e)
+                log_token_array[:, unseen_terms] = 0
+                scores = _sparse_scores(fold_columns, fold_offsets, log_token_array, log_label_array)
+                correct[e] += int((trained[scores.argmin(axis=1)] == labels[start:end]).sum())
+
+        return {e: correct[e] / len(documents) for e in epsilons}
+
+    def _hashed_documents(self, documents: Iterable[Dict]) -> Iterator[Dict]:
+        for doc in documents:
+            yield {'label': doc['label'], 'ids': self._hashed_ids(doc['text'].split())}
+
     def train(self, training_set: List[Dict]):
+        if self.hash_features:
+            # hashed documents are counted straight into the label x bucket arrays
+            self.train_stream(self._hashed_documents(training_set))
+            return
         self.compute_counts(training_set)
-        self.calculate_probabilities(training_set)
+        self.prune_vocabulary()
+        if self.vectorized:
+            self.calculate_probability_arrays(training_set)
+        else:
+            self.calculate_probabilities(training_set)
+
+    def train_parallel(self, training_set: List[Dict], workers: int):
+        # map-reduce train(): shards of the training set are counted in worker
+        # processes and their count tables added up here. Hashed models are trained
+        # here, since their count tables are not keyed by term.
+        if self.hash_features:
+            self.train(training_set)
+            return
+        with ProcessPoolExecutor(workers) as pool:
+            for tables in pool.map(_count_shard, _shards(training_set, workers)):
+                self._add_counts(*tables)
+        self.prune_vocabulary()
+        if self.vectorized:
+            self.calculate_probability_arrays(training_set)
+        else:
+            self.calculate_probabilities(training_set)
+
+    def classify_parallel(self, test_set: List[Dict],
+                          workers: int) -> List[Tuple[str, str, str, Dict[str, float]]]:
+        # the model is saved to a temporary file once and memory-mapped by every
+        # worker, which then scores shards of the test set; results keep test_set's order
+        model_file, model_path = tempfile.mkstemp(suffix='.model')
+        os.close(model_file)
+        try:
+            self.save_model(model_path)
+            with ProcessPoolExecutor(workers, initializer=_load_worker_model, initargs=(model_path,)) as pool:
+                results = []
+                for shard_results in pool.map(_classify_shard, _shards(test_set, workers)):
+                    results.extend(shard_results)
+                return results
+        finally:
+            os.remove(model_path)
+
+
+def _log_probabilities(label_counts: np.ndarray, counts: np.ndarray, total_docs: int,
+                       e: float) -> Tuple[np.ndarray, np.ndarray]:
+    # label log-priors and label x term log-probabilities from the label counts and
+    # the label x term document counts, smoothed with epsilon e
+    num_labels = len(label_counts)
+    label_probs = (label_counts / total_docs + e) / (1 + num_labels * e)
+    token_probs = (counts / label_counts[:, None] + e) / (1 + 2 * e)
+    return -np.log2(label_probs), -np.log2(token_probs)
+
+def _feature_scores(counts: np.ndarray, label_counts: np.ndarray, num_docs: int,
+                    method: str) -> np.ndarray:
+    # how informative each term (column of the label x term document counts) is of
+    # the label: its largest chi-square statistic over the labels, or its information gain
+    document_frequency = counts.sum(axis=0)
+    if method == 'chi2':
+        # 2 x 2 tables of (in label, has term) for every label and term
+        a = counts
+        b = document_frequency - a
+        c = label_counts[:, None] - a
+        d = num_docs - a - b - c
+        denominator = (a + c) * (b + d) * (a + b) * (c + d)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            chi2 = np.where(denominator > 0, num_docs * (a * d - b * c) ** 2 / denominator, 0)
+        return chi2.max(axis=0)
+
+    def entropy(probs: np.ndarray) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return -np.where(probs > 0, probs * np.log2(probs), 0).sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        with_term = np.nan_to_num(counts / document_frequency)
+        without_term = np.nan_to_num((label_counts[:, None] - counts) / (num_docs - document_frequency))
+    term_prob = document_frequency / num_docs
+    return (entropy(label_counts[:, None] / num_docs)
+            - term_prob * entropy(with_term) - (1 - term_prob) * entropy(without_term))
+
+def _sparse_scores(columns: np.ndarray, offsets: np.ndarray, log_token_array: np.ndarray,
+                   log_label_array: np.ndarray) -> np.ndarray:
+    # document x label scores of the CSR document-term matrix (columns, offsets)
+    num_docs = len(offsets) - 1
+    rows = np.repeat(np.arange(num_docs), np.diff(offsets))
+    scores = np.empty((num_docs, len(log_label_array)))
+    # document-term matrix times the log-probability matrix, one label column at a time
+    for column, log_probs in enumerate(log_token_array):
+        scores[:, column] = np.bincount(rows, weights=log_probs[columns], minlength=num_docs)
+    return scores + log_label_array
+
+def _shards(documents: List[Dict], workers: int) -> List[List[Dict]]:
+    # contiguous shards, a few per worker so that uneven shards even out
+    size = max(1, -(-len(documents) // (4 * workers)))
+    return [documents[start:start + size] for start in range(0, len(documents), size)]
+
+def _count_shard(documents: List[Dict]) -> Tuple[Dict[str, int], Dict[str, Dict[str, int]], int]:
+    shard = DocumentClassifier()
+    shard.compute_counts(documents)
+    return shard.count_tables()
+
+_worker_model = None
+
+def _load_worker_model(model_path: str):
+    global _worker_model
+    _worker_model = DocumentClassifier.load_model(model_path)
+
+def _classify_shard(documents: List[Dict]) -> List[Tuple[str, str, str, Dict[str, float]]]:
+    return _worker_model.classify_documents(documents)
 
 
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python textClassifier.py <corpus_file> <train_size>")
-        sys.exit(1)
-
-    corpus_file = sys.argv[1]
-    train_size = int(sys.argv[2])
+    parser = argparse.ArgumentParser(usage="python textClassifier.py <corpus_file> <train_size> [options]")
+    parser.add_argument('corpus_file')
+    parser.add_argument('train_size', type=int)
+    parser.add_argument('--vectorized', action='store_true',
+                        help="train and classify with NumPy label x term arrays")
+    parser.add_argument('--stream', action='store_true',
+                        help="read the corpus as a stream without holding it in memory "
+                             "(corpus_file may be - for stdin); implies --vectorized")
+    parser.add_argument('--save-model', metavar='MODEL_FILE',
+                        help="save the trained model to MODEL_FILE")
+    parser.add_argument('--load-model', metavar='MODEL_FILE',
+                        help="classify with a model saved by --save-model instead of training; "
+                             "the first train_size documents are skipped")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="train and classify with this many processes "
+                             "(not used with --stream or --load-model)")
+    parser.add_argument('--epsilon', type=float, default=0.1,
+                        help="smoothing of the label and term probabilities")
+    parser.add_argument('--cross-validate', type=int, metavar='K',
+                        help="choose the epsilon from --epsilons with K-fold cross-validation on "
+                             "the first train_size documents before training on all of them "
+                             "(not used with --stream or --load-model)")
+    parser.add_argument('--epsilons', default='0.01,0.02,0.05,0.1,0.2,0.5',
+                        help="comma-separated epsilons tried by --cross-validate")
+    parser.add_argument('--min-df', type=int, default=1,
+                        help="drop terms found in fewer training documents than this")
+    parser.add_argument('--max-features', type=int,
+                        help="keep only this many terms, chosen by --feature-selection")
+    parser.add_argument('--feature-selection', choices=FEATURE_SELECTIONS, default='chi2',
+                        help="how --max-features ranks the terms")
+    parser.add_argument('--hash-features', type=int, default=0, metavar='N',
+                        help="hash the terms into N columns instead of keeping a vocabulary; "
+                             "implies --vectorized")
+    parser.add_argument('--compare-unpruned', action='store_true',
+                        help="also train a model without --min-df, --max-features and "
+                             "--hash-features and report both accuracies "
+                             "(not used with --stream or --load-model)")
+    args = parser.parse_args()
+
+    corpus_file = args.corpus_file
+    train_size = args.train_size
+
+    if args.load_model:
+        classifier = DocumentClassifier.load_model(args.load_model)
+        try:
+            documents = classifier.iter_corpus(corpus_file)
+            for _ in islice(documents, train_size):
+                pass
+            predictions = classifier.classify_stream(classifier.with_term_ids(documents, grow_vocabulary=False))
+            print_predictions(predictions)
+        except FileNotFoundError:
+            print(f"Error: Corpus file '{corpus_file}' not found.")
+            sys.exit(1)
+        return
 
-    classifier = DocumentClassifier()
-    train_set, test_set = classifier.load_corpus(corpus_file, train_size)
+    try:
+        classifier = DocumentClassifier(vectorized=args.vectorized, epsilon=args.epsilon,
+                                        min_df=args.min_df, max_features=args.max_features,
+                                        feature_selection=args.feature_selection,
+                                        hash_features=args.hash_features)
+    except ValueError as error:
+        parser.error(str(error))
 
-    classifier.train(train_set)
+    if args.stream:
+        try:
+            documents = classifier.iter_corpus(corpus_file)
+            classifier.train_stream(classifier.with_term_ids(islice(documents, train_size), grow_vocabulary=True))
+            if args.save_model:
+                classifier.save_model(args.save_model)
+            predictions = classifier.classify_stream(classifier.with_term_ids(documents, grow_vocabulary=False))
+            print_predictions(predictions)
+        except FileNotFoundError:
+            print(f"Error: Corpus file '{corpus_file}' not found.")
+            sys.exit(1)
+        return
 
-    predictions = classifier.classify_documents(test_set)
+    train_set, test_set = classifier.load_corpus(corpus_file, train_size)
 
+    if args.cross_validate:
+        epsilons = [float(e) for e in args.epsilons.split(',')]
+        accuracies = classifier.cross_validate(train_set, args.cross_validate, epsilons)
+        print(f"{args.cross_validate}-fold cross-validation on {len(train_set)} documents:")
+        for e, accuracy in accuracies.items():
+            print(f"epsilon {e}: accuracy {accuracy:.4f}")
+        classifier.epsilon = max(accuracies, key=accuracies.get)
+        print(f"Training with epsilon {classifier.epsilon}.\n")
+
+    if args.workers > 1:
+        classifier.train_parallel(train_set, args.workers)
+    else:
+        classifier.train(train_set)
+    if args.save_model:
+        classifier.save_model(args.save_model)
+
+    if args.workers > 1:
+        predictions = classifier.classify_parallel(test_set, args.workers)
+    else:
+        predictions = classifier.classify_documents(test_set)
+
+    accuracy = print_predictions(predictions)
+
+    if args.compare_unpruned:
+        unpruned = DocumentClassifier(vectorized=classifier.vectorized, epsilon=classifier.epsilon)
+        unpruned.labels = set(classifier.labels)
+        unpruned.terms = {token for doc in train_set for token in doc['text'].split()}
+        unpruned.train(train_set)
+        predictions = unpruned.classify_documents(test_set)
+        unpruned_accuracy = sum(actual == predicted for _, actual, predicted, _ in predictions) / len(predictions)
+        num_terms = classifier.hash_features or len(classifier.terms)
+        print(f"Unpruned model: {len(unpruned.terms)} terms, accuracy {unpruned_accuracy:.4f}. "
+              f"This model: {num_terms} {'hash buckets' if classifier.hash_features else 'terms'}, "
+              f"accuracy {accuracy:.4f}.")
+
+def print_predictions(predictions: Iterable[Tuple[str, str, str, Dict[str, float]]]) -> float:
     correct_predictions = 0
+    num_predictions = 0
     for doc_name, actual_label, predicted_label, probabilities in predictions:
         correctness = "Right" if actual_label == predicted_label else "Wrong"
         label_probs = " ".join([f"{label}: {prob:.2f}" for label, prob in probabilities.items()])
         print(f"{doc_name}. Prediction: {predicted_label}. {correctness}.")
         print(label_probs)
+        num_predictions += 1
         if actual_label == predicted_label:
             correct_predictions += 1
 
-    accuracy = correct_predictions / len(test_set)
-    print(f"\nOverall accuracy: {correct_predictions} out of {len(test_set)} = {accuracy:.2f}.")
+    accuracy = correct_predictions / num_predictions
+    print(f"\nOverall accuracy: {correct_predictions} out of {num_predictions} = {accuracy:.2f}.")
+    return accuracy
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
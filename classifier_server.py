@@ -0,0 +1,286 @@
+# Classification server for classifier.py
+#
+# Trains a DocumentClassifier once (or loads one saved with --save-model) and answers
+# requests over a line protocol, on stdin/stdout by default or on a local socket:
+#
+#   python classifier_server.py --load-model model.bin [--socket /tmp/classifier.sock | --port 8765]
+#   python classifier_server.py --corpus corpus.txt --train-size 1000
+#
+# Each request is a line with a JSON object {"id": ..., "text": "document body"} and is
+# answered with a line {"id": ..., "label": ..., "probabilities": {label: probability}}.
+# Responses to a connection's requests may come out of order; "id" matches them up.
+# The line {"stats": true} is answered with the server's throughput and latency counters.
+# Lines longer than LINE_LIMIT bytes are answered with an error and skipped.
+#
+# Requests arriving together are micro-batched: they are scored in one vectorized pass
+# of up to --max-batch documents, collected for at most --max-wait milliseconds.
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from collections import deque
+from typing import List, Dict, Tuple, Optional
+
+import numpy as np
+
+from classifier import DocumentClassifier
+
+# longest request line, in bytes, on stdin and on sockets
+LINE_LIMIT = 2 ** 24
+
+class ServerStats:
+    # counters since the server started, and the latencies of the latest requests
+
+    def __init__(self, window: int = 10000):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=window)
+
+    def record_batch(self, latencies: List[float]):
+        self.batches += 1
+        self.requests += len(latencies)
+        self.latencies.extend(latencies)
+
+    def snapshot(self) -> Dict[str, float]:
+        elapsed = time.perf_counter() - self.started
+        stats = {
+            'requests': self.requests,
+            'errors': self.errors,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'uptime_seconds': elapsed,
+            'requests_per_second': self.requests / elapsed if elapsed else 0.0,
+        }
+        if self.latencies:
+            latencies = np.array(self.latencies) * 1000
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            stats.update(latency_ms_mean=float(latencies.mean()), latency_ms_p50=float(p50),
+                         latency_ms_p95=float(p95), latency_ms_p99=float(p99),
+                         latency_ms_max=float(latencies.max()))
+        return stats
+
+class MicroBatcher:
+    # queues documents from concurrent requests and scores them in batches
+
+    def __init__(self, classifier: DocumentClassifier, max_batch: int = 256, max_wait: float = 0.002):
+        self.classifier = classifier
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.stats = ServerStats()
+
+    async def classify(self, text: str) -> Tuple[str, Dict[str, float]]:
+        # the predicted label and label probabilities of a document body
+        tokens = self.classifier.clean_lines([text])[0]
+        doc = {'name': None, 'label': None, 'ids': self.classifier.term_ids(tokens, grow_vocabulary=False)}
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((doc, future, time.perf_counter()))
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[Dict, asyncio.Future, float]]:
+        # waits for a request, then takes the ones arriving within max_wait of it
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            docs = [doc for doc, _, _ in batch]
+            # scored in a thread so that requests keep being read (and the next batch
+            # filled) meanwhile
+            try:
+                results = await loop.run_in_executor(None, self.classifier.classify_documents, docs)
+            except Exception as error:
+                self.stats.errors += len(batch)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            finished = time.perf_counter()
+            for (_, future, _), (_, _, predicted, probabilities) in zip(batch, results):
+                if not future.done():
+                    future.set_result((predicted, probabilities))
+            self.stats.record_batch([finished - queued for _, _, queued in batch])
+
+async def answer(batcher: MicroBatcher, line: str) -> Dict:
+    request = None
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("request must be a JSON object")
+        if request.get('stats'):
+            return batcher.stats.snapshot()
+        text = request['text']
+        if not isinstance(text, str):
+            raise ValueError("'text' must be a string")
+    except (ValueError, KeyError) as error:
+        batcher.stats.errors += 1
+        if isinstance(request, dict):
+            return {'id': request.get('id'), 'error': f"bad request: {error}"}
+        return {'error': f"bad request: {error}"}
+    try:
+        predicted, probabilities = await batcher.classify(text)
+    except Exception as error:
+        return {'id': request.get('id'), 'error': f"classification failed: {error}"}
+    return {'id': request.get('id'), 'label': predicted, 'probabilities': probabilities}
+
+async def skip_line(reader: asyncio.StreamReader):
+    # discards the rest of a line longer than the reader's limit, up to its newline
+    while True:
+        try:
+            await reader.readuntil(b'\n')
+            return
+        except asyncio.LimitOverrunError as error:
+            await reader.readexactly(error.consumed)
+        except asyncio.IncompleteReadError:
+            return
+
+async def serve_lines(batcher: MicroBatcher, reader: asyncio.StreamReader, write):
+    # answers every line from reader, each in its own task so that they can share batches
+    pending = set()
+
+    async def respond(line: str):
+        write(json.dumps(await answer(batcher, line)) + '\n')
+
+    while True:
+        try:
+            line = await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as error:
+            # the last line, without a newline
+            line = error.partial
+        except asyncio.LimitOverrunError:
+            batcher.stats.errors += 1
+            write(json.dumps({'error': f"bad request: line longer than {LINE_LIMIT} bytes"}) + '\n')
+            await skip_line(reader)
+            continue
+        if not line:
+            break
+        try:
+            line = line.decode('utf-8').strip()
+        except UnicodeDecodeError as error:
+            batcher.stats.errors += 1
+            write(json.dumps({'error': f"bad request: {error}"}) + '\n')
+            continue
+        if not line:
+            continue
+        task = asyncio.create_task(respond(line))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.wait(pending)
+
+async def serve_connection(batcher: MicroBatcher, reader: asyncio.StreamReader,
+                           writer: asyncio.StreamWriter):
+    try:
+        await serve_lines(batcher, reader, lambda response: writer.write(response.encode('utf-8')))
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def report_stats(batcher: MicroBatcher, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        print(json.dumps(batcher.stats.snapshot()), file=sys.stderr, flush=True)
+
+async def serve(classifier: DocumentClassifier, socket_path: Optional[str], port: Optional[int],
+                max_batch: int, max_wait: float, stats_interval: Optional[float]):
+    batcher = MicroBatcher(classifier, max_batch, max_wait)
+    tasks = [asyncio.create_task(batcher.run())]
+    if stats_interval:
+        tasks.append(asyncio.create_task(report_stats(batcher, stats_interval)))
+
+    def connected(reader, writer):
+        return serve_connection(batcher, reader, writer)
+
+    try:
+        if socket_path or port is not None:
+            if socket_path:
+                server = await asyncio.start_unix_server(connected, path=socket_path, limit=LINE_LIMIT)
+            else:
+                server = await asyncio.start_server(connected, host='127.0.0.1', port=port, limit=LINE_LIMIT)
+            print(f"Serving on {socket_path or f'127.0.0.1:{port}'}", file=sys.stderr, flush=True)
+            async with server:
+                await server.serve_forever()
+        else:
+            loop = asyncio.get_running_loop()
+            reader = asyncio.StreamReader(limit=LINE_LIMIT)
+
+            # stdin is read in a thread, since it may be a file or a console rather than a pipe
+            def read_stdin():
+                for line in sys.stdin.buffer:
+                    loop.call_soon_threadsafe(reader.feed_data, line)
+                loop.call_soon_threadsafe(reader.feed_eof)
+
+            threading.Thread(target=read_stdin, daemon=True).start()
+
+            def write(response):
+                sys.stdout.write(response)
+                sys.stdout.flush()
+
+            await serve_lines(batcher, reader, write)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if stats_interval:
+            print(json.dumps(batcher.stats.snapshot()), file=sys.stderr, flush=True)
+
+def load_classifier(args: argparse.Namespace) -> DocumentClassifier:
+    if args.load_model:
+        return DocumentClassifier.load_model(args.load_model)
+    classifier = DocumentClassifier(vectorized=True, epsilon=args.epsilon, min_df=args.min_df,
+                                    max_features=args.max_features, hash_features=args.hash_features)
+    training_set, _ = classifier.load_corpus(args.corpus, args.train_size)
+    classifier.train(training_set)
+    return classifier
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve DocumentClassifier predictions over a line protocol.')
+    model = parser.add_mutually_exclusive_group(required=True)
+    model.add_argument('--load-model', metavar='MODEL_FILE', help="model saved by classifier.py --save-model")
+    model.add_argument('--corpus', help="corpus file to train on")
+    parser.add_argument('--train-size', type=int, help="number of documents of --corpus to train on (default: all)")
+    parser.add_argument('--epsilon', type=float, default=0.1, help="smoothing, when training")
+    parser.add_argument('--min-df', type=int, default=1, help="as in classifier.py, when training")
+    parser.add_argument('--max-features', type=int, help="as in classifier.py, when training")
+    parser.add_argument('--hash-features', type=int, default=0, help="as in classifier.py, when training")
+    listen = parser.add_mutually_exclusive_group()
+    listen.add_argument('--socket', metavar='PATH', help="listen on a Unix socket instead of stdin")
+    listen.add_argument('--port', type=int, help="listen on this TCP port of 127.0.0.1 instead of stdin")
+    parser.add_argument('--max-batch', type=int, default=256, help="largest number of documents scored together")
+    parser.add_argument('--max-wait', type=float, default=2.0,
+                        help="milliseconds a request may wait for others to batch with")
+    parser.add_argument('--stats-interval', type=float, metavar='SECONDS',
+                        help="print the counters to stderr this often, and on exit")
+    args = parser.parse_args()
+
+    if args.corpus and args.train_size is None:
+        args.train_size = sys.maxsize
+    classifier = load_classifier(args)
+    try:
+        asyncio.run(serve(classifier, args.socket, args.port, args.max_batch,
+                          args.max_wait / 1000, args.stats_interval))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,6 @@
 import asyncio
+import time
+import argparse
 from viam.robot.client import RobotClient
 from viam.rpc.dial import Credentials, DialOptions
 from viam.components.sensor import Sensor
@@ -11,9 +13,11 @@ from viam.components.movement_sensor import MovementSensor
 from viam.services.vision import VisionClient
 from viam.services.slam import SLAMClient
 from viam.media.utils.pil import pil_to_viam_image, viam_to_pil_image
+from simulated_robot import SimulatedRobot
 
-base = Base.from_robot(machine, "viam_base")
+base_name = "viam_base"
 camera_name = "cam"
+detector_name = "vision-15"
 
 
 async def connect():
@@ -23,84 +27,314 @@ async def connect():
     )
     return await RobotClient.at_address("rover15-main.ulfzthvv99.viam.cloud", opts)
 
-def leftOrRight(detections, midpoint):
-    largest_area = 0
-    largest = {"x_max": 0, "x_min": 0, "y_max": 0, "y_min": 0}
-    if not detections:
-        print("nothing detected :(")
-        return -1
-    for d in detections:
-        a = (d.x_max - d.x_min) * (d.y_max-d.y_min)
-        if a > largest_area:
-            a = largest_area
-            largest = d
-    centerX = largest.x_min + largest.x_max/2
+class RobotSession:
+    # one connection to the rover, and the base, camera and vision service resolved
+    # from it once, shared by all the loops. Use as
+    #   async with await RobotSession.open() as session: ...
+    # or RobotSession.simulated(SimulatedRobot(...)) to run without the rover.
+    def __init__(self, base, camera, detector, close):
+        self.base = base
+        self.camera = camera
+        self.detector = detector
+        self._close = close
+
+    @classmethod
+    async def open(cls):
+        machine = await connect()
+        return cls(Base.from_robot(machine, base_name),
+                   Camera.from_robot(machine, camera_name),
+                   VisionClient.from_robot(machine, detector_name),
+                   machine.close)
+
+    @classmethod
+    def simulated(cls, robot):
+        return cls(robot.base, robot.camera, robot.detector, robot.close)
+
+    async def close(self):
+        await self._close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+def boxArea(d):
+    return (d.x_max - d.x_min) * (d.y_max - d.y_min)
+
+def boxCenter(d):
+    return (d.x_min + d.x_max) / 2
+
+def side(centerX, midpoint):
     if centerX < midpoint-midpoint/6:
         return 0  # on the left
     if centerX > midpoint+midpoint/6:
         return 2  # on the right
     else:
         return 1  # basically centered
-    
+
 async def search_for_object(base, search_spin_speed):
     print("Searching for object")
     await base.spin(search_spin_speed, 300)
     
+class Track:
+    # constant-velocity (alpha-beta) filter of the horizontal box centre of one class
+    def __init__(self, class_name, x, area, stamp, source):
+        self.class_name = class_name
+        self.x = x              # centre at stamp, pixels
+        self.velocity = 0.0     # pixels per second
+        self.area = area
+        self.stamp = stamp      # time of the last detection fused in
+        self.hits = 1
+        self.residual = 0.0     # last detection minus the prediction for it
+        self.matched = False    # the last detection was checked against a prediction
+        self.sources = [source]
+        self.restarted = False
+
+    def predict(self, stamp, horizon=float("inf")):
+        return self.x + self.velocity * min(stamp - self.stamp, horizon)
+
+    def restart(self):
+        # the next detection is taken as it is, with no velocity
+        self.velocity = 0.0
+        self.restarted = True
+
+    def update(self, x, area, stamp, source, alpha, beta):
+        dt = stamp - self.stamp
+        self.matched = not self.restarted
+        if self.restarted:
+            self.x, self.residual, self.restarted = x, 0.0, False
+        else:
+            predicted = self.predict(stamp)
+            self.residual = x - predicted
+            self.x = predicted + alpha * self.residual
+            if dt > 0:
+                self.velocity += beta * self.residual / dt
+        self.area = area
+        self.stamp = stamp
+        self.hits += 1
+        self.sources = (self.sources + [source])[-5:]
+
+class TargetTracker:
+    # fuses detections over time into one track per class, from the largest box of
+    # the class in each detection; the target is the live track with the largest box.
+    # While the target's detections keep matching its prediction, interval (the pause
+    # between detection requests) doubles up to max_interval; otherwise it is min_interval.
+    # The base turning moves every box by itself, which is not the target's velocity:
+    # turned() restarts the tracks' velocities and interval, and is called before and after
+    # each spin; a track is not confident again until a detection matches its prediction.
+    # A detection is identified by (detection request number, index in the request).
+    def __init__(self, alpha=0.5, beta=0.2, max_age=1.5, horizon=0.5, tolerance=25, confident_hits=3,
+                 min_interval=0.0, interval_step=0.1, max_interval=0.8):
+        self.alpha = alpha
+        self.beta = beta
+        self.max_age = max_age              # seconds a track lives without detections
+        self.horizon = horizon              # seconds a track's velocity is extrapolated for
+        self.tolerance = tolerance          # pixels of residual a confident track may have
+        self.confident_hits = confident_hits
+        self.min_interval = min_interval
+        self.interval_step = interval_step
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.tracks = {}
+        self.requests = 0
+
+    def update(self, detections, stamp):
+        self.requests += 1
+        largest = {}
+        for index, d in enumerate(detections):
+            if d.class_name not in largest or boxArea(d) > boxArea(largest[d.class_name][1]):
+                largest[d.class_name] = (index, d)
+        for class_name, (index, d) in largest.items():
+            source = (self.requests, index)
+            track = self.tracks.get(class_name)
+            if track is None or stamp - track.stamp > self.max_age:
+                self.tracks[class_name] = Track(class_name, boxCenter(d), boxArea(d), stamp, source)
+            else:
+                track.update(boxCenter(d), boxArea(d), stamp, source, self.alpha, self.beta)
+        self.tracks = {name: track for name, track in self.tracks.items()
+                       if stamp - track.stamp <= self.max_age}
+
+        target = self.target(stamp)
+        if target is not None and self.confident(target, stamp):
+            self.interval = min(self.max_interval, max(self.interval_step, 2 * self.interval))
+        else:
+            self.interval = self.min_interval
+
+    def turned(self):
+        for track in self.tracks.values():
+            track.restart()
+        self.interval = self.min_interval
 
-async def tracking():
-    machine = await connect()
+    def predict(self, track, stamp):
+        return track.predict(stamp, self.horizon)
+
+    def target(self, stamp):
+        live = [track for track in self.tracks.values() if stamp - track.stamp <= self.max_age]
+        return max(live, key=lambda track: track.area, default=None)
+
+    def confident(self, track, stamp):
+        return (track.stamp == stamp and track.matched and track.hits >= self.confident_hits
+                and abs(track.residual) <= self.tolerance)
+
+class LatestSlot:
+    # holds only the newest value put in it: a value replaced before it was taken is
+    # dropped (and counted), so the reader always acts on the freshest one
+    def __init__(self):
+        self.value = None
+        self.taken = True
+        self.dropped = 0
+        self.changed = asyncio.Event()
+
+    def put(self, value):
+        if not self.taken:
+            self.dropped += 1
+        self.value = value
+        self.taken = False
+        self.changed.set()
+
+    async def take(self):
+        while self.taken:
+            self.changed.clear()
+            await self.changed.wait()
+        self.taken = True
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+async def produceDetections(detector, camera_name, slot, latencies, tracker):
+    # keeps requesting detections, whatever the base is doing, pausing for the
+    # tracker's interval between requests. An error is put in the slot so that the
+    # controller taking it raises it.
+    try:
+        while True:
+            requested = time.perf_counter()
+            detections = await detector.get_detections_from_camera(camera_name)
+            received = time.perf_counter()
+            latencies["detect"].append(received - requested)
+            slot.put((detections, requested, received))
+            await asyncio.sleep(tracker.interval)
+    except Exception as error:
+        slot.put(error)
+
+def printLatencies(latencies, dropped):
+    for stage, values in latencies.items():
+        if values:
+            print(f"{stage}: mean {1000 * sum(values) / len(values):.1f} ms, "
+                  f"max {1000 * max(values):.1f} ms over {len(values)} cycles")
+    print(f"stale detections dropped: {dropped}")
+
+
+async def tracking(session, tracker=None):
+    base = session.base
     spinNum = 5         # when turning, spin the motor this much
     straightNum = 300    # when going straight, spin motor this much
     numCycles = 200      # run the loop X times
+    period = 0.1         # decide at least this often (seconds), between detections too
     vel = 500            # go this fast when moving motor
     more = 15           # turn more (a larger angle) if not detected
-    camera_name = "cam"
-    camera = Camera.from_robot(machine, "cam")
-    frame = await camera.get_image(mime_type="image/jpeg")
+    frame = await session.camera.get_image(mime_type="image/jpeg")
 
     # Convert to PIL Image
     pil_frame = viam_to_pil_image(frame)
 
-    # Grab the vision service for the detector huan cheng objectDetector
-    my_detector = VisionClient.from_robot(machine, "vision-15")
-    
-    for i in range(numCycles):
-        detections = await my_detector.get_detections_from_camera(camera_name)
+    # the vision service for the detector huan cheng objectDetector
+    my_detector = session.detector
+
+    if tracker is None:
+        tracker = TargetTracker()
+
+    async def spin(angle):
+        tracker.turned()
+        try:
+            await base.spin(angle, vel)
+        finally:
+            tracker.turned()
 
-        answer = leftOrRight(detections, pil_frame.size[0]/2)
+    async def move(answer):
         if answer == 0:
             print("left")
-            await base.spin(spinNum, vel)     # CCW is positive
+            await spin(spinNum)     # CCW is positive
             await base.move_straight(straightNum, vel)
-        if answer == 1:
+        elif answer == 1:
             print("center")
             await base.move_straight(straightNum, vel)
-        if answer == 2:
+        elif answer == 2:
             print("right")
-            await base.spin(-spinNum, vel)
+            await spin(-spinNum)
         else:
-            print("No object detected, starting searching")
-            # While the object is not detected (-1), start searching
-            while answer == -1:
-                # Start with a smaller spin, then gradually increase the search area
-                await base.spin(more, vel)
-                
-                detections = await my_detector.get_detections_from_camera(camera_name)
-
-                answer = leftOrRight(detections, pil_frame.size[0] / 2)
-
-        # If object is detected, resume normal tracking
-        if answer != -1:
-            print("Object detected. Resuming tracking.")
-    await machine.close()        
-
-async def person_detect(detector, base):
+            print("No object detected, searching")
+            await spin(more)
+
+    # detections are fetched by a producer task while the base moves and fused by the
+    # tracker. Each cycle (a new detection, or period without one) steers by the
+    # target's predicted position. A different decision cancels the motion in progress;
+    # the same one lets it finish.
+    # latencies per cycle: detect = vision round trip, wait = age of the detection
+    # when the controller takes it, reaction = detection request to motion command
+    # decisions: for each cycle, the answer, the predicted centre it was made from,
+    # whether a new detection came in, and the detections fused into the target's track
+    latencies = {"detect": [], "wait": [], "reaction": []}
+    decisions = []
+    slot = LatestSlot()
+    producer = asyncio.create_task(produceDetections(my_detector, camera_name, slot, latencies, tracker))
+    motion = None
+    moving = None
+    started = time.perf_counter()
+    try:
+        for i in range(numCycles):
+            try:
+                item = await asyncio.wait_for(slot.take(), period)
+            except asyncio.TimeoutError:
+                item = None
+            now = time.perf_counter()
+            if item is not None:
+                detections, requested, received = item
+                latencies["wait"].append(now - received)
+                tracker.update(detections, received)
+
+            target = tracker.target(now)
+            if target is None:
+                answer, centerX = -1, None
+            else:
+                centerX = tracker.predict(target, now)
+                answer = side(centerX, pil_frame.size[0]/2)
+            decisions.append({"cycle": i, "answer": answer, "x": centerX, "new_detection": item is not None,
+                              "class": target.class_name if target else None,
+                              "detections": list(target.sources) if target else []})
+
+            if motion is not None and not motion.done():
+                if answer == moving:
+                    continue
+                motion.cancel()
+                await base.stop()
+            motion = asyncio.create_task(move(answer))
+            moving = answer
+            if item is not None:
+                latencies["reaction"].append(time.perf_counter() - requested)
+    finally:
+        producer.cancel()
+        if motion is not None and not motion.done():
+            motion.cancel()
+            await base.stop()
+        printLatencies(latencies, slot.dropped)
+        elapsed = time.perf_counter() - started
+        print(f"{len(latencies['detect'])} detection requests in {elapsed:.1f} s "
+              f"({len(latencies['detect']) / elapsed:.1f} per second) for {len(decisions)} decisions")
+    return decisions
+
+async def person_detect(session):
+    detector = session.detector
+    base = session.base
+    # seeded with the detections seen here, so that tracking starts with a track
+    tracker = TargetTracker()
     while (True):
         # look for a bottle
         found = False
         #global base_state
         print("will detect")
         detections = await detector.get_detections_from_camera(camera_name)
+        tracker.update(detections, time.perf_counter())
         for d in detections:
             if d.confidence > .7:
                 print(d.class_name)
@@ -118,7 +352,7 @@ async def person_detect(detector, base):
                 #base_state = "straight"
                 #await base.move_straight(distance=800, velocity=250)
                 #base_state = "stopped"
-            tracking()        
+            await tracking(session, tracker)
         else:
             print("I will turn and look for a bottle")
             #base_state = "spinning"
@@ -130,11 +364,19 @@ async def person_detect(detector, base):
         await asyncio.sleep(2)
 
 async def main():
-    robot = await connect()
-    rover_base = Base.from_robot(robot, 'viam_base')
-    detector = VisionClient.from_robot(robot, name=detector_name)
-    await person_detect()
-    await robot.close()
+    parser = argparse.ArgumentParser(description="Find a person and follow them with the rover.")
+    parser.add_argument("--simulate", action="store_true",
+                        help="run against an in-process simulated robot instead of the rover")
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="with --simulate, run motion and detection latency this many times faster")
+    args = parser.parse_args()
+
+    if args.simulate:
+        session = RobotSession.simulated(SimulatedRobot(speedup=args.speedup))
+    else:
+        session = await RobotSession.open()
+    async with session:
+        await person_detect(session)
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
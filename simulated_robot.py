@@ -0,0 +1,123 @@
+# An in-process stand-in for the rover in final.py, for running and load-testing the
+# control loops without the cloud endpoint.
+#
+# SimulatedRobot has a base, a camera and a detector with the methods final.py uses.
+# The base turns and drives in a simple world: every target sits at a fixed bearing,
+# and the detector reports the ones inside the camera's field of view, placed in the
+# frame by their bearing relative to the base's heading. A detection stream (a list or
+# iterable of detection lists) can be given instead, and is replayed in order.
+# Motion takes its angle / velocity in seconds and each detection request takes a
+# latency from the latency model, all divided by speedup.
+import asyncio
+import random
+import time
+
+from PIL import Image
+from viam.media.video import CameraMimeType
+from viam.media.utils.pil import pil_to_viam_image
+
+class SimulatedDetection:
+    # the fields of a vision service detection that final.py reads
+    def __init__(self, class_name, confidence, x_min, y_min, x_max, y_max):
+        self.class_name = class_name
+        self.confidence = confidence
+        self.x_min = x_min
+        self.y_min = y_min
+        self.x_max = x_max
+        self.y_max = y_max
+
+    def __repr__(self):
+        return (f"SimulatedDetection({self.class_name!r}, {self.confidence:.2f}, "
+                f"x {self.x_min}-{self.x_max}, y {self.y_min}-{self.y_max})")
+
+class SimulatedBase:
+    def __init__(self, robot):
+        self.robot = robot
+        self.heading = 0.0      # degrees, CCW positive
+        self.distance = 0.0     # mm driven
+        self.commands = []      # (time, command, amount, velocity)
+
+    async def _move(self, command, amount, velocity, apply):
+        # waits for the motion to take its time and applies it; a cancelled motion
+        # applies the part done before it was cancelled
+        self.commands.append((time.perf_counter(), command, amount, velocity))
+        duration = abs(amount) / abs(velocity) / self.robot.speedup if velocity else 0
+        start = time.perf_counter()
+        try:
+            await asyncio.sleep(duration)
+        except asyncio.CancelledError:
+            apply(amount * min(1.0, (time.perf_counter() - start) / duration) if duration else amount)
+            raise
+        apply(amount)
+
+    async def spin(self, angle, velocity, **kwargs):
+        await self._move("spin", angle, velocity, self._turn)
+
+    async def move_straight(self, distance, velocity, **kwargs):
+        await self._move("move_straight", distance, velocity, self._drive)
+
+    async def stop(self, **kwargs):
+        self.commands.append((time.perf_counter(), "stop", 0, 0))
+
+    def _turn(self, angle):
+        self.heading += angle
+
+    def _drive(self, distance):
+        self.distance += distance
+
+class SimulatedCamera:
+    def __init__(self, robot):
+        self.robot = robot
+
+    async def get_image(self, mime_type="image/jpeg", **kwargs):
+        return pil_to_viam_image(Image.new("RGB", (self.robot.width, self.robot.height)), CameraMimeType.JPEG)
+
+class SimulatedDetector:
+    def __init__(self, robot):
+        self.robot = robot
+        self.requests = 0
+
+    async def get_detections_from_camera(self, camera_name, **kwargs):
+        self.requests += 1
+        await asyncio.sleep(self.robot.latency() / self.robot.speedup)
+        if self.robot.stream is not None:
+            return list(next(self.robot.stream, []))
+        return self.robot.visible()
+
+class SimulatedRobot:
+    # targets: (class name, bearing in degrees, confidence); latency: seconds a detection
+    # request takes, or a function returning them; jitter: latency varies uniformly by
+    # up to this much either way
+    def __init__(self, targets=(("Person", 20.0, 0.9),), detections=None, latency=0.1, jitter=0.02,
+                 width=640, height=480, field_of_view=60.0, box_size=80, speedup=1.0, seed=None):
+        self.targets = list(targets)
+        self.stream = iter(detections) if detections is not None else None
+        self.random = random.Random(seed)
+        self.latency = latency if callable(latency) else (
+            lambda: max(0.0, latency + self.random.uniform(-jitter, jitter)))
+        self.width = width
+        self.height = height
+        self.field_of_view = field_of_view
+        self.box_size = box_size
+        self.speedup = speedup
+        self.base = SimulatedBase(self)
+        self.camera = SimulatedCamera(self)
+        self.detector = SimulatedDetector(self)
+
+    def visible(self):
+        # targets to the left (positive relative bearing) appear left of the centre
+        detections = []
+        for class_name, bearing, confidence in self.targets:
+            relative = (bearing - self.base.heading + 180) % 360 - 180
+            if abs(relative) > self.field_of_view / 2:
+                continue
+            center = self.width / 2 - relative / self.field_of_view * self.width
+            half = self.box_size / 2
+            detections.append(SimulatedDetection(
+                class_name, confidence,
+                int(max(0, center - half)), int(self.height / 2 - half),
+                int(min(self.width, center + half)), int(self.height / 2 + half)))
+        return detections
+
+    async def close(self):
+        pass
@@ -0,0 +1,110 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import bestcoverset as bsc
+
+
+# an instance whose costs are not exact in binary: {S1, S2, S3} covers omega
+# at a cost of exactly the budget
+def floatProblem():
+    a, b, c, d = (bsc.Element(name, cost) for name, cost in (('a', 0.1), ('b', 0.2), ('c', 0.3), ('d', 0.3)))
+    collection = [bsc.CSet('S1', {a, b}), bsc.CSet('S2', {c}), bsc.CSet('S3', {d}), bsc.CSet('S4', {a, c})]
+    return bsc.CompiledProblem({a, b, c, d}, collection)
+
+def test_cover_state_float_costs_reach_zero():
+    cp = floatProblem()
+    state = bsc.CoverState(cp, 0.9, [])
+    for i in (0, 1, 2):
+        state.toggle(i)
+    assert state.error() == 0
+    assert bsc.CoverState(cp, 0.9, [0, 1, 2]).error() == 0
+
+def test_cover_state_error_does_not_depend_on_moves():
+    cp = floatProblem()
+    state = bsc.CoverState(cp, 0.9, [])
+    for i in (3, 0, 1, 3, 2, 1, 3):
+        state.toggle(i)
+    assert state.error() == bsc.CoverState(cp, 0.9, list(state.state)).error()
+
+def test_hill_climb_float_costs():
+    cp = floatProblem()
+    state, err = bsc.hillClimb(cp, 0.9, [0, 1], False)
+    assert err == 0
+    assert sorted(state) == [0, 1, 2]
+
+# an instance on which the vectorized climber used to cycle: a state scored by errors()
+# and as a neighbor by neighbor_errors() came out 1 ulp apart, so it looked like an improvement
+def cyclingProblem():
+    costs = {'e0': 0.3, 'e1': 0.3, 'e2': 0.1, 'e3': 0.7, 'e4': 0.2, 'e5': 0.1, 'e6': 0.2, 'e7': 0.1}
+    elements = {name: bsc.Element(name, cost) for name, cost in costs.items()}
+    sets = [('S1', 'e1 e6 e7'), ('S2', 'e0 e1 e4 e7'), ('S3', 'e2 e6'), ('S4', 'e1 e6'),
+            ('S5', 'e2'), ('S6', 'e0 e1 e2 e5'), ('S7', 'e1 e3')]
+    collection = [bsc.CSet(name, {elements[e] for e in names.split()}) for name, names in sets]
+    return bsc.CompiledProblem(set(elements.values()), collection)
+
+def test_vectorized_moves_always_improve():
+    cp = cyclingProblem()
+    ap = bsc.ArrayProblem(cp)
+    states = np.array(list(itertools.product([False, True], repeat=len(cp.collection))))
+    for budget in (1.5, 1.8, 2.0, 2.1, 2.3, 2.4, 2.7, 3.0, 3.7):
+        err = ap.errors(states, budget)
+        nbor_err = ap.neighbor_errors(states, budget)
+        best = nbor_err.argmin(axis=1)
+        moves = nbor_err[np.arange(len(states)), best] < err - ap.tolerance(budget)
+        moved = states[moves].copy()
+        moved[np.arange(len(moved)), best[moves]] ^= True
+        assert (ap.errors(moved, budget) < err[moves]).all()
+
+def test_vectorized_float_costs_terminate():
+    cp = cyclingProblem()
+    np.random.seed(5)
+    solution, found = bsc.BestSetCoverHillClimbVectorized(cp, 2.0, 5, False)
+    if found:
+        assert bsc.CoverState(cp, 2.0, [cp.position[c] for c in solution]).error() == 0
+
+# a set holds an element outside omega, and omega is only coverable with it counted
+def test_save_load_keeps_omega(tmp_path):
+    a, b, x = bsc.Element('a', 1), bsc.Element('b', 2), bsc.Element('x', 4)
+    collection = [bsc.CSet('S1', {a, x}), bsc.CSet('S2', {b})]
+    cp = bsc.CompiledProblem({a, b}, collection)
+    filename = str(tmp_path / 'problem.txt.gz')
+    bsc.saveProblem(cp, filename)
+    loaded = bsc.loadProblem(filename)
+    assert sorted(e.name for e in loaded.omega) == ['a', 'b']
+    assert [sorted(e.name for e in c.elements) for c in loaded.collection] == [['a', 'x'], ['b']]
+    for state in ([], [0], [1], [0, 1]):
+        assert bsc.CoverState(loaded, 7, state).error() == bsc.CoverState(cp, 7, state).error()
+
+# integer costs with a fractional budget: the overrun of S1 must not be rounded away
+def test_vectorized_fractional_budget():
+    a, b = bsc.Element('a', 1), bsc.Element('b', 1)
+    cp = bsc.CompiledProblem({a, b}, [bsc.CSet('S1', {a, b})])
+    ap = bsc.ArrayProblem(cp)
+    assert ap.errors(np.array([True]), 1.5) == bsc.CoverState(cp, 1.5, [0]).error() == 0.5
+    assert ap.neighbor_errors(np.array([False]), 1.5)[0] == 0.5
+    assert bsc.BestSetCoverHillClimbVectorized(cp, 1.5, 3, False)[1] is False
+    assert bsc.BestSetCoverHillClimbVectorized(cp, 2, 3, False)[1] is True
+
+# problem1 builds new CSets on every call, so warm starts are resolved by set name
+def test_warm_start_from_problem_function():
+    cold = sorted(c.name for c in bsc.BestSetCoverIDS(bsc.problem1, 30, False)[0])
+    solution, found = bsc.BestSetCoverIDS(bsc.problem1, 30, False, start=bsc.greedyCover(bsc.problem1))
+    assert found and sorted(c.name for c in solution) == cold
+    cover, _ = bsc.relaxedCover(bsc.problem1)
+    assert bsc.BestSetCoverHillClimb(bsc.problem1, 30, 1, False, start=cover)[1]
+    solution, found = bsc.BestSetCoverAnneal(bsc.problem1, 30, False, evaluations=200, seed=0, start=cover)
+    assert found
+    cp = bsc.CompiledProblem(*bsc.problem1())
+    assert cp.indices([0, 2]) == [0, 2]
+
+def test_save_rejects_names_with_whitespace(tmp_path):
+    filename = tmp_path / 'problem.txt'
+    box = bsc.Element('big box', 2)
+    with pytest.raises(ValueError):
+        bsc.saveProblem(bsc.CompiledProblem({box}, [bsc.CSet('S1', {box})]), str(filename))
+    a, b = bsc.Element('a', 1), bsc.Element('b', 1)
+    with pytest.raises(ValueError):
+        bsc.saveProblem(bsc.CompiledProblem({a, b}, [bsc.CSet('S 1', {a}), bsc.CSet('S2', {b})]), str(filename))
+    assert not filename.exists()
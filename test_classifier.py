@@ -0,0 +1,34 @@
+import numpy as np
+
+from classifier import DocumentClassifier
+
+
+# two labels with their own words, and words shared by both
+def make_documents(count, seed=0):
+    rng = np.random.default_rng(seed)
+    words = {'alpha': ['apple', 'apricot', 'avocado', 'almond'], 'beta': ['banana', 'berry', 'brazil', 'bean']}
+    shared = ['common', 'usual', 'plain', 'often']
+    documents = []
+    for i in range(count):
+        label = 'alpha' if rng.random() < 0.5 else 'beta'
+        text = ' '.join(rng.choice(words[label] + shared, size=8).tolist())
+        documents.append({'name': f"Doc {i}", 'label': label, 'text': text})
+    return documents
+
+def probabilities(classifier, documents):
+    return [probs for _, _, _, probs in classifier.classify_documents(documents)]
+
+def test_saved_dict_model_follows_partial_fit(tmp_path):
+    documents = make_documents(200)
+    classifier = DocumentClassifier()
+    classifier.partial_fit(documents[:4])
+    classifier.save_model(str(tmp_path / 'first.bin'))
+    classifier.partial_fit(documents[4:150])
+    classifier.save_model(str(tmp_path / 'second.bin'))
+
+    loaded = DocumentClassifier.load_model(str(tmp_path / 'second.bin'))
+    retrained = DocumentClassifier(vectorized=True)
+    retrained.partial_fit(documents[:150])
+    for saved, expected in zip(probabilities(loaded, documents[150:]), probabilities(retrained, documents[150:])):
+        assert saved.keys() == expected.keys()
+        assert all(np.isclose(saved[label], expected[label]) for label in saved)
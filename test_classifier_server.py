@@ -0,0 +1,46 @@
+import json
+import asyncio
+
+import classifier_server
+from classifier import DocumentClassifier
+from test_classifier import make_documents
+
+
+# the responses of serve_lines to data, and the errors counted, for a model trained
+# as load_classifier does
+def serve(data, directory):
+    corpus = directory / 'corpus.txt'
+    corpus.write_text(''.join(f"{doc['name']}\n{doc['label']}\n{doc['text']}\n\n" for doc in make_documents(100)))
+    classifier = DocumentClassifier(vectorized=True)
+    training_set, _ = classifier.load_corpus(str(corpus), 100)
+    classifier.train(training_set)
+
+    async def run():
+        batcher = classifier_server.MicroBatcher(classifier)
+        batching = asyncio.create_task(batcher.run())
+        reader = asyncio.StreamReader(limit=classifier_server.LINE_LIMIT)
+        reader.feed_data(data)
+        reader.feed_eof()
+        responses = []
+        await classifier_server.serve_lines(batcher, reader, responses.append)
+        batching.cancel()
+        return [json.loads(response) for response in responses], batcher.stats.errors
+
+    return asyncio.run(run())
+
+def request(id, text='apple banana common'):
+    return (json.dumps({'id': id, 'text': text}) + '\n').encode('utf-8')
+
+def test_bad_lines_are_answered(tmp_path):
+    overlong = b'{"id": 2, "text": "' + b'x' * classifier_server.LINE_LIMIT + b'"}\n'
+    data = (request(1) + b'{"id": 3, "text": "caf\xe9"}\n' + overlong + b'[1, 2]\n'
+            + b'{"id": 4, "txt": "apple"}\n' + request(5).rstrip(b'\n'))
+    responses, errors = serve(data, tmp_path)
+    answered = {response['id']: response for response in responses if 'label' in response}
+    assert sorted(answered) == [1, 5]
+    failed = [response for response in responses if 'error' in response]
+    assert len(failed) == errors == 4
+    assert any('utf-8' in response['error'] for response in failed)
+    assert any('longer than' in response['error'] for response in failed)
+    assert any('JSON object' in response['error'] for response in failed)
+    assert {'id': 4, 'error': "bad request: 'text'"} in failed